@@ -5,19 +5,14 @@ Chat/Doubt Agent
 Answers contextual questions about uploaded study materials
 """
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 import os
 import logging
-from dotenv import load_dotenv
+from utils import first_set, load_env
 
-try:
-    load_dotenv()
-except UnicodeDecodeError:
-    pass
-except Exception:
-    pass
+load_env()
 logger = logging.getLogger(__name__)
 
 # Try importing google-generativeai as fallback
@@ -62,6 +57,17 @@ class DirectGenAIChat:
                 self.content = content
         
         return Response(response.text if response.text else "No response generated")
+    
+    def stream(self, messages):
+        # Same prompt flattening as invoke(), but yields partial responses as they arrive
+        text_content = "".join(msg.content + "\n" for msg in messages if hasattr(msg, 'content'))
+
+        class Chunk:
+            def __init__(self, content):
+                self.content = content
+
+        for chunk in self.model.generate_content(text_content, stream=True):
+            yield Chunk(chunk.text)
 
 
 class ChatAgent:
@@ -70,7 +76,7 @@ class ChatAgent:
     def __init__(self, vector_store=None):
         self.vector_store = vector_store
         
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("OPENAI_API_KEY")
+        api_key = first_set(os.environ)
         self.llm = None
         
         if api_key:
@@ -117,17 +123,13 @@ class ChatAgent:
             if not self.llm:
                 logger.warning(f"Failed to initialize any Gemini model. Please check your API key and model availability.")
     
-    def answer_question(self, question: str, n_chunks: int = 5, prioritize_source: Optional[str] = None) -> Dict:
+    def _prepare(self, question: str, n_chunks: int, prioritize_source: Optional[str]) -> Dict:
         """
-        Answer a question using RAG from study materials
+        Retrieve context and build the LLM messages for a question
         
-        Args:
-            question: User's question
-            n_chunks: Number of relevant chunks to retrieve
-            prioritize_source: Optional filename to prioritize in search
-            
         Returns:
-            Dict with 'answer', 'sources', and 'chunks' keys
+            Dict with 'messages', 'sources' and 'chunks', or with 'answer' set
+            when the agent can't reach the LLM
         """
         logger.info(f"answer_question: question='{question[:50]}...', n_chunks={n_chunks}, prioritize={prioritize_source}")
         
@@ -197,28 +199,6 @@ Question: {question}
 
 Please provide a helpful answer based ONLY on the context above, or state that the information is not available."""
         
-        try:
-            if not self.llm:
-                return {
-                    'answer': "⚠️ Chat agent not initialized. Please check your GOOGLE_API_KEY in the .env file.",
-                    'sources': [],
-                    'chunks': []
-                }
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            response = self.llm.invoke(messages)
-            answer = response.content
-        except Exception as e:
-            error_msg = str(e)
-            if "404" in error_msg or "NOT_FOUND" in error_msg:
-                answer = "⚠️ Model not found. Please check your API key and ensure you have access to Gemini models. If the issue persists, try updating your langchain-google-genai package."
-            elif "API key" in error_msg.lower() or "authentication" in error_msg.lower():
-                answer = "⚠️ API key error. Please check your GOOGLE_API_KEY in the .env file and ensure it's valid."
-            else:
-                answer = f"⚠️ Error generating answer: {error_msg}. Please check your API configuration."
-        
         # Extract unique sources
         sources = list(set([
             chunk['metadata'].get('source', 'Unknown')
@@ -226,11 +206,71 @@ Please provide a helpful answer based ONLY on the context above, or state that t
         ])) if relevant_chunks else []
         
         return {
-            'answer': answer,
+            'messages': [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_prompt)
+            ],
             'sources': sources,
             'chunks': relevant_chunks
         }
     
+    @staticmethod
+    def _error_answer(e: Exception) -> str:
+        """User-facing message for an LLM call failure"""
+        error_msg = str(e)
+        if "404" in error_msg or "NOT_FOUND" in error_msg:
+            return "⚠️ Model not found. Please check your API key and ensure you have access to Gemini models. If the issue persists, try updating your langchain-google-genai package."
+        elif "API key" in error_msg.lower() or "authentication" in error_msg.lower():
+            return "⚠️ API key error. Please check your GOOGLE_API_KEY in the .env file and ensure it's valid."
+        return f"⚠️ Error generating answer: {error_msg}. Please check your API configuration."
+    
+    def answer_question(self, question: str, n_chunks: int = 5, prioritize_source: Optional[str] = None) -> Dict:
+        """
+        Answer a question using RAG from study materials
+        
+        Args:
+            question: User's question
+            n_chunks: Number of relevant chunks to retrieve
+            prioritize_source: Optional filename to prioritize in search
+            
+        Returns:
+            Dict with 'answer', 'sources', and 'chunks' keys
+        """
+        prepared = self._prepare(question, n_chunks, prioritize_source)
+        if 'answer' in prepared:
+            return prepared
+        
+        messages = prepared.pop('messages')
+        try:
+            answer = self.llm.invoke(messages).content
+        except Exception as e:
+            answer = self._error_answer(e)
+
+        return {'answer': answer, **prepared}
+    
+    def answer_question_stream(self, question: str, n_chunks: int = 5, prioritize_source: Optional[str] = None) -> Dict:
+        """
+        Like answer_question, but 'answer' is an iterator of text deltas
+        
+        Retrieval happens up front so 'sources' is available immediately;
+        the LLM call starts when the iterator is first consumed.
+        """
+        prepared = self._prepare(question, n_chunks, prioritize_source)
+        if 'answer' in prepared:
+            return {**prepared, 'answer': iter([prepared['answer']])}
+        
+        messages = prepared.pop('messages')
+        return {'answer': self._stream_llm(messages), **prepared}
+    
+    def _stream_llm(self, messages) -> Iterator[str]:
+        """Yield answer text as the LLM produces it; failures end the stream with the error message"""
+        try:
+            for chunk in self.llm.stream(messages):
+                if isinstance(chunk.content, str) and chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            yield self._error_answer(e)
+    
     def explain_concept(self, concept: str, n_chunks: int = 5) -> Dict:
         """Provide detailed explanation of a concept"""
         question = f"Explain {concept} in detail with examples"
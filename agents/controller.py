@@ -5,8 +5,11 @@ Central Controller
 Orchestrates multi-agent workflow and manages inter-agent communication
 """
 
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Dict, Optional
 from .reader_agent import ReaderAgent
 from .flashcard_agent import FlashcardAgent
 from .quiz_agent import QuizAgent
@@ -20,6 +23,9 @@ from vector_store import VectorStore
 
 logger = logging.getLogger(__name__)
 
+# Documents parsed concurrently per processing run
+READ_WORKERS = int(os.getenv("READ_WORKERS", "4"))
+
 
 class KnowledgeMemory:
     """Centralized knowledge memory module for sharing context between agents"""
@@ -78,15 +84,29 @@ class KnowledgeMemory:
 class AgentController:
     """Central controller for orchestrating multi-agent workflow"""
     
-    def __init__(self, vector_store: Optional[VectorStore] = None):
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        reader_agent: Optional[ReaderAgent] = None,
+        flashcard_agent: Optional[FlashcardAgent] = None,
+        quiz_agent: Optional[QuizAgent] = None,
+        chat_agent: Optional[ChatAgent] = None,
+    ):
+        """
+        Args:
+            vector_store: Vector store for semantic search
+            reader_agent, flashcard_agent, quiz_agent, chat_agent: Optional prebuilt agents.
+                These hold only LLM clients, so one set can back several controllers; the
+                planner and knowledge memory are per-user and always created here.
+        """
         logger.info("Initializing AgentController")
         
         # Initialize agents
-        self.reader_agent = ReaderAgent()
-        self.flashcard_agent = FlashcardAgent()
-        self.quiz_agent = QuizAgent()
+        self.reader_agent = reader_agent or ReaderAgent()
+        self.flashcard_agent = flashcard_agent or FlashcardAgent()
+        self.quiz_agent = quiz_agent or QuizAgent()
         self.planner_agent = PlannerAgent()
-        self.chat_agent = ChatAgent(vector_store)
+        self.chat_agent = chat_agent or ChatAgent(vector_store)
         
         # Initialize knowledge memory
         self.memory = KnowledgeMemory()
@@ -94,8 +114,20 @@ class AgentController:
         # Vector store for semantic search
         self.vector_store = vector_store
         
+        # Per-file ingestion cache: source name -> (content digest, reader result)
+        self._ingested: Dict[str, tuple] = {}
+        
         logger.info("AgentController initialized successfully")
     
+    @staticmethod
+    def _file_digest(file_path: Path) -> str:
+        """Content hash of a file, read in 1 MiB blocks"""
+        h = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        return h.hexdigest()
+    
     def get_topic_chunks(self, topic: str) -> List[Dict]:
         """Get all chunks for a specific topic, with robust fallback to semantic search"""
         # 1. Try memory first (exact match)
@@ -136,43 +168,132 @@ class AgentController:
                 
         return chunks
     
-    def process_study_materials(self, directory_path: str) -> Dict:
+    def process_study_materials(
+        self,
+        directory_path: str,
+        progress: Optional[Callable[[str], None]] = None,
+        known_digests: Optional[Dict[str, str]] = None,
+    ) -> Dict:
         """
         Complete workflow: Read → Extract → Structure
         
+        Incremental: files whose content hash is unchanged since the last call are
+        not re-read or re-embedded; deleted files are dropped from the index.
+        
         Args:
             directory_path: Path to directory containing study materials
+            progress: Optional callback receiving a short status line per stage
+            known_digests: Optional file name -> content digest already computed by the
+                caller (e.g. while saving uploads); those files aren't re-read just to hash them
             
         Returns:
             Dict with processing results
         """
         logger.info(f"process_study_materials: Processing directory {directory_path}")
+        report = progress or (lambda message: None)
+        
+        # The index was wiped underneath us (fresh session / manual clear): ingest everything again
+        if self.vector_store and self._ingested and self.vector_store.get_collection_count() == 0:
+            self._ingested = {}
+        
+        # Step 1: Reader Agent processes only new or changed documents
+        directory = Path(directory_path)
+        current = {}
+        if directory.exists():
+            for file_path in directory.iterdir():
+                if file_path.is_file() and file_path.suffix.lower() in ReaderAgent.SUPPORTED_EXTENSIONS:
+                    current[file_path.name] = file_path
+        
+        removed = [name for name in self._ingested if name not in current]
+        for name in removed:
+            del self._ingested[name]
+            if self.vector_store:
+                self.vector_store.delete_source(name)
+        
+        # Which files need (re)reading; hashing is cheap next to parsing
+        known_digests = known_digests or {}
+        pending = []
+        for name, file_path in current.items():
+            try:
+                digest = known_digests.get(name) or self._file_digest(file_path)
+            except OSError as e:
+                logger.warning(f"process_study_materials: Cannot read {name}: {e}")
+                continue
+            cached = self._ingested.get(name)
+            if cached and cached[0] == digest:
+                continue
+            pending.append((name, file_path, digest))
+        
+        # Parse files concurrently: PDF/DOCX extraction and topic classification (an LLM call)
+        # are independent per file and mostly wait on I/O
+        def read(entry):
+            name, file_path, _ = entry
+            logger.info(f"process_study_materials: Reading {name}")
+            try:
+                result = self.reader_agent.process_document(str(file_path))
+            except Exception:
+                logger.exception(f"process_study_materials: Error processing {name}")
+                return None
+            logger.info(f"process_study_materials: Created {len(result['chunks'])} chunks from {name}")
+            return result
+        
+        results = {}
+        if pending:
+            report(f"Reading {len(pending)} document(s)")
+            with ThreadPoolExecutor(max_workers=min(READ_WORKERS, len(pending))) as ex:
+                futures = {ex.submit(read, entry): entry[0] for entry in pending}
+                for done, future in enumerate(as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    report(f"Read {futures[future]} ({done}/{len(pending)})")
+        
+        # Stage in directory order so chunk order stays deterministic; a changed file's old
+        # chunks leave the index (and _ingested) before its new ones go in
+        staged = []
+        new_chunks = []
+        for name, _, digest in pending:
+            result = results.get(name)
+            if result is None:
+                continue
+            if self._ingested.pop(name, None) and self.vector_store:
+                self.vector_store.delete_source(name)
+            staged.append((name, digest, result))
+            new_chunks.extend(result['chunks'])
+        
+        logger.info(
+            f"process_study_materials: {len(new_chunks)} new chunks, "
+            f"{len(removed)} removed source(s), {len(current)} document(s) total"
+        )
         
-        # Step 1: Reader Agent processes documents
-        result = self.reader_agent.process_directory(directory_path)
-        
-        chunks = result.get('chunks', [])
-        topics = result.get('topics', [])
-        
-        logger.info(f"process_study_materials: Extracted {len(chunks)} chunks, {len(topics)} topics")
-        
-        # Store in memory
-        self.memory.add_chunks(chunks)
-        self.memory.add_topics(topics)
-        
-        logger.info(f"process_study_materials: Memory now has {len(self.memory.chunks)} total chunks")
-        
-        # Add to vector store if available
+        # Embed only the delta. Staged files count as ingested only once they're in the index,
+        # so a failed run is retried next time instead of being skipped on a matching digest.
         if self.vector_store:
-            logger.info("process_study_materials: Adding chunks to vector store")
-            self.vector_store.clear_collection()
-            self.vector_store.add_documents(chunks)
+            if new_chunks:
+                logger.info("process_study_materials: Adding new chunks to vector store")
+                report(f"Embedding {len(new_chunks)} new chunks")
+                try:
+                    self.vector_store.add_documents(new_chunks)
+                except Exception:
+                    # Drop whatever batches made it in before the failure
+                    for name, _, _ in staged:
+                        self.vector_store.delete_source(name)
+                    raise
             self.chat_agent.vector_store = self.vector_store
             logger.info(f"process_study_materials: Vector store now has {self.vector_store.get_collection_count()} chunks")
+        for name, digest, result in staged:
+            self._ingested[name] = (digest, result)
+        
+        # Memory mirrors the current document set (rebuilt, not appended to)
+        chunks = [c for _, result in self._ingested.values() for c in result['chunks']]
+        topics = [t for _, result in self._ingested.values() for t in result['topics']]
+        self.memory.chunks = chunks
+        self.memory.topics = topics
+        
+        logger.info(f"process_study_materials: Memory now has {len(self.memory.chunks)} total chunks")
         
         # Generate samples for the dashboard
         flashcard_samples = []
         if chunks:
+            report("Drafting sample cards and challenges")
             try:
                 flashcard_samples = self.flashcard_agent.generate_flashcards(chunks[:3], num_flashcards=2)
             except: pass
@@ -368,6 +489,10 @@ class AgentController:
         """
         return self.chat_agent.answer_question(question, prioritize_source=prioritize_source)
     
+    def answer_question_stream(self, question: str, prioritize_source: Optional[str] = None) -> Dict:
+        """Same as answer_question, but 'answer' is an iterator of text deltas for incremental display"""
+        return self.chat_agent.answer_question_stream(question, prioritize_source=prioritize_source)
+    
     def evaluate_quiz(self, questions: List[Dict], user_answers: Dict[int, int]) -> Dict:
         """
         Evaluate quiz and update performance
@@ -7,6 +7,8 @@ Creates adaptive revision schedules based on topics and performance
 
 import json
 import logging
+import os
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from pathlib import Path
@@ -20,6 +22,10 @@ class PlannerAgent:
     def __init__(self):
         self.revision_plan = []
         self.progress = {}
+        # (plan list the stats were computed from, stats); reset by mark_status
+        self._stats_cache = None
+        # (path, mtime_ns, size) of the plan file the in-memory plan matches
+        self._file_stamp = None
     
     def create_revision_plan(
         self,
@@ -175,29 +181,41 @@ class PlannerAgent:
         for item in self.revision_plan:
             if item['date'] == date and item['topic'] == topic:
                 item['status'] = status
+                self._stats_cache = None
                 self.update_progress(topic, status)
                 # Auto-save after status change
                 self.save_plan()
                 break
     
     def get_statistics(self) -> Dict:
-        """Get revision statistics"""
+        """Get revision statistics (cached until the plan is replaced or a status changes)"""
+        if self._stats_cache is not None and self._stats_cache[0] is self.revision_plan:
+            return dict(self._stats_cache[1])
+        
+        counts = Counter(item.get('status') for item in self.revision_plan) if self.revision_plan else Counter()
         total = len(self.revision_plan) if self.revision_plan else 0
-        completed = sum(1 for item in self.revision_plan if item.get('status') == 'completed') if self.revision_plan else 0
-        pending = sum(1 for item in self.revision_plan if item.get('status') == 'pending') if self.revision_plan else 0
-        in_progress = sum(1 for item in self.revision_plan if item.get('status') == 'in_progress') if self.revision_plan else 0
+        completed = counts['completed']
+        pending = counts['pending']
+        in_progress = counts['in_progress']
         
         completion_rate = (completed / total * 100) if total > 0 else 0
         
         logger.debug(f"Planner stats: total={total}, completed={completed}, pending={pending}, in_progress={in_progress}")
         
-        return {
+        stats = {
             'total_topics': total,
             'completed': completed,
             'pending': pending,
             'in_progress': in_progress,
             'completion_rate': round(completion_rate, 2)
         }
+        self._stats_cache = (self.revision_plan, stats)
+        return dict(stats)
+    
+    @staticmethod
+    def _stamp(file_path: str):
+        st = os.stat(file_path)
+        return (file_path, st.st_mtime_ns, st.st_size)
     
     def save_plan(self, file_path: str = "outputs/planner.json"):
         """Save revision plan to JSON file"""
@@ -214,15 +232,23 @@ class PlannerAgent:
             
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            self._file_stamp = self._stamp(file_path)
             logger.info("Plan saved successfully")
         except Exception as e:
             logger.error(f"Error saving plan: {e}")
     
     def load_plan(self, file_path: str = "outputs/planner.json") -> List[Dict]:
-        """Load revision plan from JSON file and return it"""
+        """Load revision plan from JSON file and return it (skips the parse if the file is unchanged)"""
+        try:
+            stamp = self._stamp(file_path)
+        except OSError:
+            stamp = None
+        if stamp is not None and stamp == self._file_stamp:
+            return self.revision_plan
+        
         logger.info(f"Loading plan from {file_path}")
         try:
-            if Path(file_path).exists():
+            if stamp is not None:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.revision_plan = data.get('revision_plan', [])
@@ -232,10 +258,12 @@ class PlannerAgent:
                 logger.info("Plan file does not exist, returning empty plan")
                 self.revision_plan = []
                 self.progress = {}
+            self._file_stamp = stamp
         except Exception as e:
             logger.error(f"Error loading plan: {e}")
             self.revision_plan = []
             self.progress = {}
+            self._file_stamp = None
         
         # Return the plan for convenience
         return self.revision_plan
@@ -13,17 +13,12 @@ from typing import List, Dict, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 import os
-from dotenv import load_dotenv
+from utils import first_set, load_env
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
-try:
-    load_dotenv()
-except UnicodeDecodeError:
-    pass
-except Exception:
-    pass
+load_env()
 
 
 class QuizAgent:
@@ -31,7 +26,7 @@ class QuizAgent:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("OPENAI_API_KEY")
+        api_key = first_set(os.environ)
         if api_key:
             # Try stable Gemini 1.5 models (Gemini 2.0 discontinued)
             model_names = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro"]
@@ -15,7 +15,7 @@ from docx import Document
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 import os
-from dotenv import load_dotenv
+from utils import first_set, load_env
 
 # Optional OCR imports (for image-based / scanned PDFs)
 try:
@@ -26,24 +26,20 @@ try:
 except Exception:
     OCR_AVAILABLE = False
 
-try:
-    load_dotenv()
-except UnicodeDecodeError:
-    # If .env has encoding issues, skip it and use environment variables directly
-    pass
-except Exception:
-    pass
+load_env()
 
 
 class ReaderAgent:
     """Extracts text, segments into topics, and structures study material"""
     
+    SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+    
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         
         # Initialize LLM for topic classification
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("OPENAI_API_KEY")
+        api_key = first_set(os.environ)
         if api_key:
             # Try stable Gemini 1.5 models (Gemini 2.0 discontinued)
             model_names = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro"]
@@ -442,10 +438,8 @@ Only return valid JSON, no additional text."""
             print(f"Directory not found: {directory_path}")
             return {'chunks': [], 'topics': []}
         
-        supported_extensions = ['.pdf', '.docx', '.doc', '.txt']
-        
         for file_path in directory.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
+            if file_path.is_file() and file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS:
                 print(f"Processing: {file_path.name}")
                 try:
                     result = self.process_document(str(file_path))
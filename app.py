@@ -1,16 +1,17 @@
 import streamlit as st
+import gc
+import hashlib
+import html
 import os
-import time
-import random
-import pandas as pd
+import shutil
 from pathlib import Path
 import logging
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Tuple
 
-# --- AGENT IMPORTS ---
-from agents.controller import AgentController
-from vector_store import VectorStore
-from agents.planner_agent import PlannerAgent
+from utils import get_latest_document
 
 # --- LOGGING CONFIG ---
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +26,7 @@ st.set_page_config(
 )
 
 # --- DIRECTORY SETUP ---
+@st.cache_resource(show_spinner=False)
 def ensure_documents_directory():
     docs_dir = Path("documents")
     docs_dir.mkdir(exist_ok=True)
@@ -35,539 +37,654 @@ def ensure_outputs_directory():
     outputs_dir.mkdir(exist_ok=True)
     return outputs_dir
 
-def get_document_files():
+# Old mtimes are never asked for again, so keep only a couple of entries around.
+# The short ttl still catches in-place rewrites, which don't bump the folder mtime.
+@st.cache_data(ttl=5, max_entries=2, show_spinner=False)
+def _list_docs_cached(docs_dir: str, mtime_ns: int) -> List[Tuple[str, int, int]]:
+    """Directory listing as (name, mtime_ns, size), cached until the folder's mtime changes (add/remove)."""
+    # scandir hands back names and (on Linux, lazily; on Windows, free) stat data without building Path objects
+    with os.scandir(docs_dir) as it:
+        return [
+            (entry.name, stat.st_mtime_ns, stat.st_size)
+            for entry in it if entry.is_file()
+            for stat in (entry.stat(),)
+        ]
+
+def get_document_files() -> List[Tuple[str, int, int]]:
+    docs_dir = ensure_documents_directory()
+    return _list_docs_cached(str(docs_dir), os.stat(docs_dir).st_mtime_ns)
+
+def _compute_docs_signature() -> Tuple[Tuple[str, int, int], ...]:
+    """Signature of the documents folder; changes whenever a file is added, removed or rewritten."""
+    # Sorted (name, mtime_ns, size) tuples compare by plain equality, no digest needed
+    return tuple(sorted(get_document_files()))
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def _save_one(uploaded_file, docs_dir: Path) -> Tuple[str, bool, Optional[str]]:
+    """Write a single upload to disk. Returns (name, saved, error)."""
+    file_path = docs_dir / uploaded_file.name
+    try:
+        # Stream in 1 MiB chunks rather than materialising the whole upload as one buffer.
+        # Buffered on purpose: BufferedWriter retries short writes, which copyfileobj would ignore.
+        uploaded_file.seek(0)
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, length=UPLOAD_CHUNK_SIZE)
+        return uploaded_file.name, True, None
+    except Exception as e:
+        logger.warning(f"Failed to save {uploaded_file.name}: {e}")
+        return uploaded_file.name, False, str(e)
+
+def _upload_digest(uploaded_file) -> str:
+    """Content hash of an upload, taken over a zero-copy view of its in-memory buffer."""
+    return hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+
+def save_uploaded_files(uploaded_files) -> List[str]:
+    """Save uploads in parallel (blocking disk I/O) and track upload order. Returns saved names."""
     docs_dir = ensure_documents_directory()
-    return list(docs_dir.glob("*"))
+    # One (cached) directory listing instead of a stat() per upload; also drops in-batch duplicates
+    existing = {name for name, _, _ in get_document_files()}
+    pending = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name not in existing:
+            existing.add(uploaded_file.name)
+            pending.append(uploaded_file)
+    if not pending:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(8, len(pending))) as ex:
+        digests = dict(zip((f.name for f in pending), ex.map(_upload_digest, pending)))
+        # Same bytes under a new name: skip the write (and the re-embedding it would trigger)
+        saved_hashes = st.session_state.saved_hashes
+        unique = []
+        for uploaded_file in pending:
+            digest = digests[uploaded_file.name]
+            if digest in saved_hashes:
+                st.info(f"📎 {uploaded_file.name} matches {saved_hashes[digest]} — skipped.")
+                continue
+            saved_hashes[digest] = uploaded_file.name
+            unique.append(uploaded_file)
+        results = list(ex.map(partial(_save_one, docs_dir=docs_dir), unique))
+
+    # Session state is only touched from the script thread
+    saved_files = [name for name, saved, _ in results if saved]
+    order = st.session_state.document_upload_order
+    for name in saved_files:
+        # Track upload order (move to end on re-upload); insertion-ordered dict keeps this O(1)
+        order.pop(name, None)
+        order[name] = None
+    if saved_files:
+        st.session_state.latest_document = saved_files[-1]
+        _list_docs_cached.clear()
+    # Stat of the file as written: its digest is only trusted while the file still matches this
+    saved_stamps = st.session_state.saved_stamps
+    for name in saved_files:
+        try:
+            stat = os.stat(docs_dir / name)
+        except OSError:
+            continue
+        saved_stamps[name] = (digests[name], stat.st_mtime_ns, stat.st_size)
+    for name, _, error in results:
+        if error:
+            saved_hashes.pop(digests[name], None)
+            st.error(f"⚠️ Could not save {name}: {error}")
+    return saved_files
+
+def _handle_upload(form_key: str, save_label: str, process_label: str, rerun_on_save: bool = False, **uploader_kwargs):
+    """Uploader + SAVE / PROCESS pair in one form, so picking files doesn't rerun the script.
+    
+    rerun_on_save: set where the form sits below content that depends on documents_processed
+    (the dashboard), which has already been drawn by the time a save flips it."""
+    # Success note carried over a save-triggered rerun
+    notice = st.session_state.pop(f"{form_key}_notice", None)
+    if notice:
+        st.success(notice)
+    with st.form(form_key, clear_on_submit=True):
+        uploaded_files = st.file_uploader(
+            uploader_kwargs.pop("label", "📎 Upload Study Materials"),
+            type=['pdf', 'docx', 'doc', 'txt'],
+            accept_multiple_files=True,
+            **uploader_kwargs
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            save_clicked = st.form_submit_button(save_label, use_container_width=True, type="primary")
+        with col2:
+            process_clicked = st.form_submit_button(process_label, use_container_width=True, type="primary")
+
+    if save_clicked and uploaded_files:
+        saved = len(save_uploaded_files(uploaded_files))
+        if saved > 0:
+            st.session_state.documents_processed = False
+            if rerun_on_save:
+                st.session_state[f"{form_key}_notice"] = f"✅ Saved {saved} file(s)!"
+                st.rerun()
+            # Otherwise no st.rerun(): the sidebar status is drawn after the page body, so it already sees the new files
+            st.success(f"✅ Saved {saved} file(s)!")
+        else:
+            st.info("Files already exist.")
+    elif process_clicked:
+        # Save first if needed
+        if uploaded_files:
+            save_uploaded_files(uploaded_files)
+        # Runs in the background; the sidebar monitor (drawn after this) reports progress
+        process_documents()
 
 # --- CLEANUP LOGIC ---
 def cleanup_session():
     """Wipe everything for a fresh mission start."""
-    # 1. Delete files in documents/
-    docs_dir = Path("documents")
-    if docs_dir.exists():
-        for f in docs_dir.glob("*"):
-            try: f.unlink()
-            except: pass
-    
-    # 2. Delete files in outputs/
-    outputs_dir = Path("outputs")
-    if outputs_dir.exists():
-        for f in outputs_dir.glob("*"):
-            try: f.unlink()
-            except: pass
+    # 1. Delete files in documents/, 2. Delete files in outputs/
+    for dir_name in ("documents", "outputs"):
+        if os.path.isdir(dir_name):
+            for name in os.listdir(dir_name):
+                try: os.unlink(os.path.join(dir_name, name))
+                except: pass
+    _list_docs_cached.clear()
+    st.session_state.latest_document = None
+    st.session_state.saved_hashes = {}
+    st.session_state.saved_stamps = {}
             
-    # 3. Reset Vector Store
+    # 3. Reset Vector Store (the store itself is shared, so only its collection is dropped)
     if 'vector_store' in st.session_state and st.session_state.vector_store:
-        try:
-            # Delete the correct collection name
-            st.session_state.vector_store.client.delete_collection("campus_compass")
-            st.session_state.vector_store = VectorStore() # Re-init
-        except Exception as e:
-            logger.warning(f"Error deleting collection: {e}")
-            # Force re-init anyway
-            try:
-                st.session_state.vector_store = VectorStore()
-            except: pass
+        st.session_state.vector_store.clear_collection()
+
+# --- SHARED RESOURCES ---
+@st.cache_resource(show_spinner=False)
+def get_vector_store():
+    """Embedding model + Chroma client, built once per server process."""
+    from vector_store import VectorStore
+    return VectorStore()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _cached_chunk_count(index_version: int) -> int:
+    """Collection size, re-queried only after the shared store has been written to."""
+    return get_vector_store().get_collection_count()
+
+@st.cache_resource(show_spinner=False)
+def get_shared_agents() -> Dict:
+    """Stateless agents (LLM clients) bound to the shared vector store, built once per server process."""
+    from agents.reader_agent import ReaderAgent
+    from agents.flashcard_agent import FlashcardAgent
+    from agents.quiz_agent import QuizAgent
+    from agents.chat_agent import ChatAgent
+    return {
+        "reader_agent": ReaderAgent(),
+        "flashcard_agent": FlashcardAgent(),
+        "quiz_agent": QuizAgent(),
+        "chat_agent": ChatAgent(get_vector_store()),
+    }
+
+def new_agent_controller():
+    """Per-session controller: own knowledge memory and planner around the shared agents."""
+    from agents.controller import AgentController
+    return AgentController(get_vector_store(), **get_shared_agents())
+
+# --- CUSTOM CSS (THE DEADPOOL EXPERIENCE - REFINED) ---
+@st.cache_resource(show_spinner=False)
+def load_css() -> str:
+    """Theme <style> block, read and wrapped once per process (shared, not copied per call)."""
+    return "<style>" + (Path(__file__).parent / "static" / "deadpool.css").read_text(encoding="utf-8") + "</style>"
+
+# Still emitted every run: Streamlit drops any element a rerun doesn't re-send
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# Distinct flashcard/quiz generations kept per session
+GENERATED_CACHE_SIZE = 16
+
+# Exchanges rendered by default on the chat page; older ones move to an on-demand archive
+CHAT_HISTORY_WINDOW = 50
 
 # --- SESSION STATE INITIALIZATION ---
 if 'initialized' not in st.session_state:
-    # FRESH SESSION CLEANUP
+    # FRESH SESSION CLEANUP (drops and recreates the collection, no id scan needed)
+    st.session_state.vector_store = get_vector_store()
     cleanup_session()
     
     st.session_state.initialized = True
-    st.session_state.current_page = "Home"
-    st.session_state.vector_store = VectorStore()
-    # Clear any existing data in the collection
-    try:
-        if st.session_state.vector_store.collection:
-            # Delete all existing data
-            all_ids = st.session_state.vector_store.collection.get()['ids']
-            if all_ids:
-                st.session_state.vector_store.collection.delete(ids=all_ids)
-                logger.info(f"Cleared {len(all_ids)} existing chunks from vector store")
-    except Exception as e:
-        logger.warning(f"Error clearing vector store on init: {e}")
     
-    st.session_state.agent_controller = AgentController(st.session_state.vector_store)
-    st.session_state.documents_processed = False
-    st.session_state.flashcards = []
-    st.session_state.quizzes = []
-    st.session_state.quiz_answers = {}
-    st.session_state.chat_history = []
-    st.session_state.latest_document = None
-    st.session_state.num_flashcards = 10
-    st.session_state.num_questions = 10
-    st.session_state.document_upload_order = []
-    st.session_state.planner_study_mode = None
-    st.session_state.planner_study_topic = None
+    # Per-session controller (memory, planner, ingestion cache); only the agents behind it are shared
+    st.session_state.agent_controller = new_agent_controller()
 
-# --- CUSTOM CSS (THE DEADPOOL EXPERIENCE - REFINED) ---
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Bangers&family=Oswald:wght@300;400;500;700&display=swap');
-
-    :root {
-        /* Core Palette - Normalized */
-        --dp-red-primary: #C70000;  /* Brighter, truer red */
-        --dp-red-dark: #780000;     /* Deep blood red for shadows/accents */
-        --dp-black: #0F0F0F;        /* Deep matte black, not pure #000 */
-        --dp-dark-gray: #1A1A1A;    /* For cards/surfaces */
-        --dp-white: #F5F5F5;        /* Off-white for better readability */
-        --dp-text-muted: #A0A0A0;   /* Secondary text */
-        
-        /* Structural */
-        --dp-border-width: 4px;
-        --dp-border-radius: 2px;    /* Slight rounding, still sharp */
-    }
-
-    /* GLOBAL THEME OVERRIDE */
-    .stApp {
-        background-color: var(--dp-black);
-        color: var(--dp-white);
-        /* Subtle texture instead of jarring dots */
-        background-image: 
-            linear-gradient(rgba(0, 0, 0, 0.7), rgba(0, 0, 0, 0.7)),
-            url("data:image/svg+xml,%3Csvg width='60' height='60' viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'%3E%3Cg fill='none' fill-rule='evenodd'%3E%3Cg fill='%23780000' fill-opacity='0.15'%3E%3Cpath d='M36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
-    }
-    
-    /* Internal Frame - Thinner, more elegant */
-    .stApp::before {
-        content: "";
-        position: fixed;
-        top: 10px; left: 10px; right: 10px; bottom: 10px;
-        border: 2px solid rgba(255, 255, 255, 0.1);
-        pointer-events: none;
-        z-index: 9999;
-    }
+# Cheap per-session defaults (the heavy objects above are only built once)
+for key, default in {
+    'current_page': "Home",
+    'documents_processed': False,
+    'flashcards': [],
+    'quizzes': [],
+    'quiz_answers': {},
+    'quiz_submitted': False,
+    'quiz_result': None,
+    'chat_history': deque(maxlen=CHAT_HISTORY_WINDOW),  # recent exchanges, each with its rendered 'html'
+    'chat_archive': [],  # exchanges evicted from chat_history, oldest first
+    'show_chat_archive': False,
+    'latest_document': None,
+    'num_flashcards': 10,
+    'num_questions': 10,
+    'document_upload_order': {},  # name -> None, insertion-ordered
+    'saved_hashes': {},  # content digest -> saved name
+    'saved_stamps': {},  # saved name -> (content digest, mtime_ns, size) right after the write
+    'docs_signature': None,
+    'process_future': None,
+    'process_signature': None,
+    'process_progress': {},  # stage line written by the background worker
+    'generated_cache': {},  # (kind, docs_signature, settings) -> generated flashcards/quiz
+    'planner_study_mode': None,
+    'planner_study_topic': None,
+}.items():
+    st.session_state.setdefault(key, default)
 
-    /* TYPOGRAPHY SYSTEM */
-    h1, h2, h3, .designer-header {
-        font-family: 'Bangers', cursive !important;
-        letter-spacing: 1.5px;
-        text-transform: uppercase;
-        color: var(--dp-white) !important;
-        text-shadow: 3px 3px 0px rgba(0,0,0,0.8);
-        margin-bottom: 1rem !important;
-    }
-    
-    h1 { font-size: 3.5rem !important; }
-    h2 { font-size: 2.5rem !important; }
-    h3 { font-size: 1.8rem !important; }
-    
-    p, span, div, label, li {
-        font-family: 'Oswald', sans-serif !important;
-        letter-spacing: 0.5px;
-    }
+# --- HELPER FUNCTIONS ---
+def _navigate(page: str):
+    """Button callback: switch page before the click's own rerun (no second st.rerun())."""
+    st.session_state.current_page = page
 
-    /* CARD STYLES - Refined */
-    .designer-card-red {
-        background: linear-gradient(135deg, var(--dp-red-primary), var(--dp-red-dark));
-        padding: 2rem;
-        border: var(--dp-border-width) solid #000;
-        box-shadow: 8px 8px 0px rgba(0,0,0,0.6);
-        margin-bottom: 1.5rem;
-        position: relative;
-        transition: transform 0.2s ease, box-shadow 0.2s ease;
-    }
+# State resets run as button callbacks, before the click's rerun, so the page isn't drawn twice
+def _reset_quiz():
+    st.session_state.quiz_submitted = False
+    st.session_state.quiz_result = None
+    st.session_state.quiz_answers = {}
 
-    .designer-card {
-        background: var(--dp-dark-gray);
-        padding: 2rem;
-        border: var(--dp-border-width) solid var(--dp-red-primary);
-        box-shadow: 8px 8px 0px rgba(0,0,0,0.6);
-        margin-bottom: 1.5rem;
-        position: relative;
-    }
-    
-    /* Force text colors in cards */
-    .designer-card-red h1, .designer-card-red h2, .designer-card-red h3, 
-    .designer-card-red p, .designer-card-red span, .designer-card-red div {
-        color: var(--dp-white) !important;
-    }
+def _close_study_zone():
+    st.session_state.planner_study_mode = None
+    st.session_state.planner_study_topic = None
 
-    /* BUTTONS - Professional yet bold */
-    div.stButton > button {
-        background: var(--dp-red-primary) !important;
-        color: var(--dp-white) !important;
-        font-family: 'Oswald', sans-serif !important;
-        font-weight: 700 !important;
-        font-size: 1.2rem !important;
-        padding: 0.6rem 1.5rem !important;
-        border: 3px solid #000 !important;
-        box-shadow: 5px 5px 0px #000 !important;
-        transform: skew(-6deg);
-        transition: all 0.15s ease-out;
-        width: 100% !important;
-        text-transform: uppercase;
-        border-radius: 0 !important;
-    }
+def _wipe_chat():
+    st.session_state.chat_history.clear()
+    st.session_state.chat_archive = []
+    st.session_state.show_chat_archive = False
 
-    div.stButton > button:hover {
-        background: #FF1A1A !important;
-        transform: skew(-6deg) translate(-2px, -2px);
-        box-shadow: 7px 7px 0px #000 !important;
-    }
+def _show_chat_archive():
+    st.session_state.show_chat_archive = True
 
-    div.stButton > button:active {
-        transform: skew(-6deg) translate(1px, 1px);
-        box-shadow: 2px 2px 0px #000 !important;
-    }
-    
-    /* Disabled State */
-    div.stButton > button:disabled {
-        background: var(--dp-dark-gray) !important;
-        color: var(--dp-text-muted) !important;
-        border-color: var(--dp-text-muted) !important;
-        box-shadow: none !important;
-        cursor: not-allowed;
-    }
+def _append_chat(question: str, answer: str, sources: List[str]):
+    """Add an exchange to the bounded history, moving the one it evicts to the archive."""
+    history = st.session_state.chat_history
+    if len(history) == history.maxlen:
+        st.session_state.chat_archive.append(history[0])
+    history.append({
+        'question': question,
+        'answer': answer,
+        'sources': sources,
+        'html': _chat_exchange_html(question, answer, sources),
+    })
 
-    /* INPUTS & FORM ELEMENTS */
-    .stTextInput input, .stSelectbox div[data-baseweb="select"] > div, .stNumberInput input {
-        background-color: var(--dp-dark-gray) !important;
-        color: var(--dp-white) !important;
-        border: 2px solid var(--dp-red-primary) !important;
-        font-family: 'Oswald', sans-serif !important;
-        border-radius: 0px !important;
+# Static burst overlay for trigger_maximum_effort_strike()
+MAXIMUM_EFFORT_HTML = """
+<div class="max-effort-overlay" style="position: fixed; top: 0; left: 0; width: 100vw; height: 100vh; pointer-events: none; z-index: 10000; overflow: hidden;">
+    <div style="position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); color: #fff; font-family: 'Bangers'; font-size: 8rem; text-shadow: 10px 10px 0px #A80000, 20px 20px 0px #000; animation: impact 1s ease-out forwards;">MAXIMUM EFFORT!</div>
+    <div class="comic-burst" style="top: 20%; left: 20%; animation-delay: 0.1s;">BANG!</div>
+    <div class="comic-burst" style="top: 70%; left: 80%; animation-delay: 0.3s;">POW!</div>
+    <div class="comic-burst" style="top: 40%; left: 70%; animation-delay: 0.5s;">KABOOM!</div>
+</div>
+<style>
+    @keyframes impact {
+        0% { transform: translate(-50%, -50%) scale(0); opacity: 0; }
+        50% { transform: translate(-50%, -50%) scale(1.2); opacity: 1; }
+        100% { transform: translate(-50%, -50%) scale(1); opacity: 0; }
     }
-    
-    .stTextInput input:focus, .stSelectbox div[data-baseweb="select"] > div:focus-within {
-        box-shadow: 0 0 0 2px var(--dp-red-primary) !important;
-        border-color: var(--dp-white) !important;
+    .comic-burst {
+        position: absolute;
+        background: yellow;
+        color: black;
+        padding: 10px 20px;
+        font-family: 'Bangers';
+        font-size: 3rem;
+        border: 5px solid black;
+        transform: rotate(-15deg);
+        opacity: 0;
+        animation: burst 0.8s ease-out forwards;
     }
-
-    /* SIDEBAR */
-    section[data-testid="stSidebar"] {
-        background-color: #050505 !important;
-        border-right: 4px solid var(--dp-red-primary);
+    @keyframes burst {
+        0% { transform: scale(0) rotate(0deg); opacity: 0; }
+        50% { transform: scale(1.5) rotate(-20deg); opacity: 1; }
+        100% { transform: scale(1) rotate(-15deg); opacity: 0; }
     }
-    
-    /* PROGRESS BAR */
-    .stProgress > div > div > div > div {
-        background-color: var(--dp-red-primary) !important;
+    /* Clients that opt out of motion skip the overlay's layout/animation work entirely */
+    @media (prefers-reduced-motion: reduce) {
+        .max-effort-overlay { display: none; }
     }
+</style>
+"""
 
-    /* CUSTOM COMPONENT CLASSES */
-    .designer-header {
-        background: var(--dp-red-primary);
-        display: inline-block;
-        padding: 5px 20px;
-        border: 3px solid #fff;
-        box-shadow: 4px 4px 0px #000;
-        transform: rotate(-1deg);
-        margin-bottom: 1.5rem;
-        font-size: 1.5rem;
-    }
+@st.cache_resource(show_spinner=False)
+def get_process_executor() -> ThreadPoolExecutor:
+    """Single background worker: processing runs off the script thread, one job at a time."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="process_documents")
 
-    /* CHAT BUBBLES - Refined */
-    .chat-bubble {
-        padding: 1.2rem;
-        margin-bottom: 1.2rem;
-        font-family: 'Oswald', sans-serif;
-        font-size: 1.1rem;
-        line-height: 1.5;
-        border: 3px solid #000;
-        box-shadow: 6px 6px 0px rgba(0,0,0,0.3);
-    }
-    
-    .user-bubble {
-        background: var(--dp-white);
-        color: #000;
-        border-radius: 12px 12px 0 12px;
-        margin-left: 15%;
-    }
-    
-    .assistant-bubble {
-        background: var(--dp-dark-gray);
-        color: var(--dp-white);
-        border: 3px solid var(--dp-red-primary);
-        border-radius: 12px 12px 12px 0;
-        margin-right: 15%;
-    }
+def _run_processing(agent_controller, progress: Dict[str, str], known_digests: Dict[str, str]):
+    """Worker body. Must not touch st.* / session_state (no script context on this thread).
     
-    /* RADIO BUTTONS */
-    div[data-testid="stRadio"] div[role="radiogroup"] {
-        background: transparent !important;
-        padding: 0 !important;
-        border: none !important;
-        box-shadow: none !important;
-        outline: none !important;
-    }
-    
-    div[data-testid="stRadio"] label {
-        background: var(--dp-dark-gray) !important;
-        padding: 1rem !important;
-        margin-bottom: 0.5rem !important;
-        border: 2px solid #333 !important;
-        transition: all 0.2s;
-    }
-    
-    div[data-testid="stRadio"] label:hover {
-        border-color: var(--dp-red-primary) !important;
-        transform: translateX(5px);
-    }
-
-    /* EXPANDER */
-    .streamlit-expanderHeader {
-        background: var(--dp-dark-gray) !important;
-        border: 2px solid var(--dp-red-primary) !important;
-        color: var(--dp-white) !important;
-        font-family: 'Oswald', sans-serif !important;
-        font-weight: 700;
-    }
-</style>
-""", unsafe_allow_html=True)
+    Stage updates go into the plain `progress` dict, which the monitor fragment reads."""
+    try:
+        return agent_controller.process_study_materials(
+            "documents", progress=partial(progress.__setitem__, "message"), known_digests=known_digests
+        )
+    finally:
+        # Parsing/embedding leaves lots of short-lived garbage; postScriptGC is off
+        gc.collect()
 
-# --- HELPER FUNCTIONS ---
 def process_documents():
-    """Trigger the RAG pipeline."""
+    """Trigger the RAG pipeline in the background. Returns False if nothing was started."""
     docs = get_document_files()
     if not docs:
         st.warning("No documents to process, rookie!")
         return False
+    if st.session_state.process_future is not None:
+        st.info("⚔️ Already slicing, hold your chimichangas!")
+        return False
         
-    with st.spinner("⚔️ DEADPOOL IS SLICING THROUGH YOUR TEXT..."):
+    # Nothing changed on disk since the last run: keep the existing index
+    signature = _compute_docs_signature()
+    if st.session_state.documents_processed and signature == st.session_state.docs_signature:
+        logger.info("Documents unchanged since last processing, skipping pipeline")
+        return True
+    
+    st.session_state.process_signature = signature
+    st.session_state.process_progress = {"message": "Warming up the katanas"}
+    # Digests taken while saving, so the worker doesn't read each file back just to hash it.
+    # Fresh stat (not the ttl-cached listing): a file rewritten since its upload falls back to hashing.
+    known_digests = {}
+    for name, (digest, mtime_ns, size) in st.session_state.saved_stamps.items():
         try:
-            results = st.session_state.agent_controller.process_study_materials("documents")
-            st.session_state.processing_results = results
-            st.session_state.documents_processed = True
-            st.session_state.latest_document = docs[-1].name
-            
-            # TRIGGER MAXIMUM EFFORT STRIKE EFFECT
-            trigger_maximum_effort_strike()
-            return True
-        except Exception as e:
-            st.error(f"⚠️ Combat Error: {e}")
-            logger.exception("Processing failed")
-            return False
+            stat = os.stat(os.path.join("documents", name))
+        except OSError:
+            continue
+        if (stat.st_mtime_ns, stat.st_size) == (mtime_ns, size):
+            known_digests[name] = digest
+    st.session_state.process_future = get_process_executor().submit(
+        _run_processing, st.session_state.agent_controller, st.session_state.process_progress, known_digests
+    )
+    return True
+
+def _generate_cached(kind: str, generate, *args, fresh: bool = False, state=None, record=None, **kwargs) -> List[Dict]:
+    """LLM generation memoised per (settings, processed document set) for this session.
+    
+    `state` joins the key for inputs generate() reads beyond its arguments (adaptive quiz
+    history); `fresh` bypasses the cache; `record` replays generate()'s memory bookkeeping on a hit."""
+    cache = st.session_state.generated_cache
+    key = (kind, st.session_state.docs_signature, state, args, tuple(sorted(kwargs.items())))
+    if fresh or key not in cache:
+        result = generate(*args, **kwargs)
+        if not result:
+            return result  # failures/empties aren't cached, so a retry really retries
+        cache.pop(key, None)
+        if len(cache) >= GENERATED_CACHE_SIZE:
+            cache.pop(next(iter(cache)))  # oldest first
+        cache[key] = result
+    elif record:
+        record(cache[key])
+    return cache[key]
+
+def _cached_csv(kind: str, items: List[Dict], export) -> str:
+    """CSV export of a flashcard/quiz list, rebuilt only when that list is replaced."""
+    cache_key = f"{kind}_csv"
+    cached = st.session_state.get(cache_key)
+    # Identity check: generation always assigns a fresh list, and holding it keeps the id stable
+    if cached is None or cached[0] is not items:
+        cached = (items, export(items))
+        st.session_state[cache_key] = cached
+    return cached[1]
+
+def _finish_processing():
+    """Collect a finished background run on the script thread."""
+    future = st.session_state.process_future
+    st.session_state.process_future = None
+    try:
+        results = future.result()
+    except Exception as e:
+        st.error(f"⚠️ Combat Error: {e}")
+        logger.error("Processing failed", exc_info=e)
+        return
+    
+    st.session_state.processing_results = results
+    st.session_state.documents_processed = True
+    st.session_state.docs_signature = st.session_state.process_signature
+    # Saves already record the newest upload; only fall back to an mtime scan without one
+    if not st.session_state.latest_document:
+        latest = get_latest_document()
+        st.session_state.latest_document = os.path.basename(latest) if latest else None
+    
+    # TRIGGER MAXIMUM EFFORT STRIKE EFFECT
+    trigger_maximum_effort_strike()
+
+@st.fragment(run_every=1)
+def _processing_monitor():
+    """Polls the background job; a full rerun picks up the result once it's done."""
+    if st.session_state.process_future is None:
+        return
+    if st.session_state.process_future.done():
+        st.rerun()
+    st.info("⚔️ DEADPOOL IS SLICING THROUGH YOUR TEXT... (feel free to look around)")
+    st.caption(st.session_state.process_progress.get("message", ""))
 
 def trigger_maximum_effort_strike():
     """Custom high-impact comic-style animation."""
-    st.markdown("""
-    <div style="position: fixed; top: 0; left: 0; width: 100vw; height: 100vh; pointer-events: none; z-index: 10000; overflow: hidden;">
-        <div style="position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); color: #fff; font-family: 'Bangers'; font-size: 8rem; text-shadow: 10px 10px 0px #A80000, 20px 20px 0px #000; animation: impact 1s ease-out forwards;">MAXIMUM EFFORT!</div>
-        <div class="comic-burst" style="top: 20%; left: 20%; animation-delay: 0.1s;">BANG!</div>
-        <div class="comic-burst" style="top: 70%; left: 80%; animation-delay: 0.3s;">POW!</div>
-        <div class="comic-burst" style="top: 40%; left: 70%; animation-delay: 0.5s;">KABOOM!</div>
+    # No sleep needed: this runs at the top of a full rerun, so the overlay stays until the next one
+    st.markdown(MAXIMUM_EFFORT_HTML, unsafe_allow_html=True)
+
+# --- STATIC MARKUP (built once at import, not on every rerun) ---
+NAV_OPTIONS = {
+    "Home": "🏠",
+    "Flashcards": "📇",
+    "Quizzes": "📝",
+    "Revision Planner": "📅",
+    "Chat Assistant": "💬",
+    "Analytics": "📊"
+}
+# Flashcard difficulty selector: label -> generator key
+DIFFICULTY_MIX_MAP = {
+    "Easy + Medium": "easy_medium",
+    "Medium + Hard": "medium_hard",
+    "Easy + Medium + Hard": "easy_medium_hard",
+}
+DIFFICULTY_MIX_LABELS = tuple(DIFFICULTY_MIX_MAP)
+
+# page -> nav label, formatted once instead of per rerun
+NAV_LABELS = {name: f"{icon} {name.upper()}" for name, icon in NAV_OPTIONS.items()}
+NAV_PAGES = tuple(NAV_OPTIONS)
+
+SIDEBAR_HEADER_HTML = """
+<div style="text-align: center; padding: 1rem; background: var(--deadpool-red); border: 5px solid #fff; box-shadow: 5px 5px 0px #000; margin-bottom: 2rem; transform: rotate(-2deg);">
+    <h1 style="font-family: 'Bangers'; color: #fff; font-size: 2.5rem; margin: 0; text-shadow: 3px 3px 0px #000;">⚔️ ARSENAL HUB</h1>
+</div>
+"""
+
+SIDEBAR_DESTINATIONS_HTML = "<p style='font-family: \"Bangers\"; font-size: 1.4rem; color: var(--deadpool-red); margin-bottom: 2rem; text-shadow: 2px 2px 0px #000;'>🎯 DESTINATIONS</p>"
+
+HOME_HERO_HTML = """
+<div style="
+    background: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.8)), url('https://w0.peakpx.com/wallpaper/744/403/HD-wallpaper-deadpool-marvel-comic.jpg') center/cover;
+    padding: 5rem 2rem;
+    border-bottom: 4px solid var(--dp-red-primary);
+    box-shadow: 0px 10px 30px rgba(0,0,0,0.5);
+    text-align: center;
+    margin-bottom: 3rem;
+    position: relative;
+">
+    <div style="position: relative; z-index: 2;">
+        <h1 style="font-size: 4.5rem; color: #fff; text-shadow: 4px 4px 0px var(--dp-red-primary); margin: 0; letter-spacing: 2px;">WEAPONIZED KNOWLEDGE</h1>
+        <div style="
+            font-family: 'Oswald', sans-serif;
+            background: var(--dp-red-primary);
+            color: #fff;
+            font-size: 1.5rem;
+            font-weight: 700;
+            display: inline-block;
+            padding: 0.5rem 2rem;
+            transform: skew(-10deg);
+            margin-top: 1.5rem;
+            box-shadow: 5px 5px 0px #000;
+        ">
+            MAXIMUM EFFORT. MINIMUM STUDYING.
+        </div>
     </div>
-    <style>
-        @keyframes impact {
-            0% { transform: translate(-50%, -50%) scale(0); opacity: 0; }
-            50% { transform: translate(-50%, -50%) scale(1.2); opacity: 1; }
-            100% { transform: translate(-50%, -50%) scale(1); opacity: 0; }
-        }
-        .comic-burst {
-            position: absolute;
-            background: yellow;
-            color: black;
-            padding: 10px 20px;
-            font-family: 'Bangers';
-            font-size: 3rem;
-            border: 5px solid black;
-            transform: rotate(-15deg);
-            opacity: 0;
-            animation: burst 0.8s ease-out forwards;
-        }
-        @keyframes burst {
-            0% { transform: scale(0) rotate(0deg); opacity: 0; }
-            50% { transform: scale(1.5) rotate(-20deg); opacity: 1; }
-            100% { transform: scale(1) rotate(-15deg); opacity: 0; }
-        }
-    </style>
-    """, unsafe_allow_html=True)
-    time.sleep(1.5) # Let animation play
+</div>
+"""
+
+# Upload zone banners (onboarding and the dashboard's ARSENAL PORTAL)
+ONBOARDING_DROP_ZONE_HTML = """
+<div class="sexy-drop-zone" style="background: var(--dp-dark-gray); border: 2px dashed var(--dp-red-primary); padding: 3rem; text-align: center; position: relative;">
+    <h2 style="color: var(--dp-red-primary); margin-bottom: 1rem;">CLASSIFIED ARCHIVES</h2>
+    <p style="font-size: 1.2rem; color: var(--dp-white); margin-bottom: 2rem;">DROP YOUR BRAIN JUICE HERE!</p>
+</div>
+"""
+DASH_DROP_ZONE_HTML = """
+<div style="background: var(--dp-dark-gray); padding: 2rem; border: 3px dashed var(--dp-red-primary);">
+    <p style="color: var(--dp-white); font-family: 'Bangers'; font-size: 1.5rem; text-align: center; margin-bottom: 1rem;">NEED MORE AMMO? DROP IT HERE!</p>
+</div>
+"""
+
+# Dashboard MISSION INTEL metric card and INTEL SNAPS sample card
+INTEL_CARD_TEMPLATE = '<div class="designer-card-red" style="text-align: center; padding: 1.5rem !important; margin-bottom: 1rem !important;"><h4 style="font-size: 1rem; color: #fff; margin: 0;">{label}</h4><p style="font-size: 2.5rem; font-family: Bangers; color: #fff; margin: 0; text-shadow: 2px 2px 0px #000;">{value}</p></div>'
+SAMPLE_CARD_TEMPLATE = """<div style="background: #fff; padding: 1.5rem; border: 3px solid #000; margin-bottom: 15px; box-shadow: 6px 6px 0px var(--dp-red-primary);">
+<p style="color: #000; font-size: 1.1rem; font-weight: 700; margin-bottom: 8px;"><b>Q:</b> {question}</p>
+<hr style="margin: 8px 0; border-color: #000; border-width: 2px;">
+<p style="color: #333; font-size: 1rem;"><b>A:</b> {answer}</p>
+</div>"""
+
+CHAT_SOURCE_TEMPLATE = "• <span style='color:#aaa;'>{0}</span>"
+CHAT_SOURCES_BLOCK_TEMPLATE = '<details style="margin-bottom: 1rem;"><summary>📚 MISSION SOURCE CITATIONS</summary>{0}</details>'
+
+# Flashcard / quiz question card: {rotate} alternates per index, {margin} separates cards
+COMIC_CARD_TEMPLATE = """
+<div class="designer-card-red comic-card" style="transform: rotate({rotate}deg); margin-bottom: {margin} !important;">
+    <div class="comic-card-body">
+        <h4 class="designer-header comic-card-title">{title}</h4>
+        <p class="comic-card-question">Q: {question}</p>
+    </div>
+</div>
+"""
+FLASHCARD_ANSWER_TEMPLATE = """
+<div class="flashcard-answer" style="transform: rotate({rotate}deg);">
+    <p>{answer}</p>
+</div>
+"""
+FLASHCARD_REVEAL_TEMPLATE = '<details class="reveal" style="margin-bottom: 50px;"><summary>👀 REVEAL CLASSIFIED INTEL (ANSWER)</summary>{answer}</details>'
+TOPIC_REVEAL_TEMPLATE = """<details class="reveal"{open}><summary>🔴 {topic}</summary>
+<div style="background: var(--dp-dark-gray); padding: 1.5rem; border-left: 4px solid var(--dp-red-primary); margin-bottom: 10px;">{points}</div>
+</details>"""
+TOPIC_POINT_TEMPLATE = "<p style='color: var(--dp-text-muted); margin-bottom: 8px;'>⚔️ {0}</p>"
+CHUNK_CARD_TEMPLATE = """
+<div class="designer-card" style="padding: 1.5rem !important; border-left: 6px solid var(--dp-red-primary); margin-bottom: 1.5rem;">
+    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
+        <span style="background: var(--dp-red-primary); color: white; padding: 2px 10px; font-family: 'Bangers'; font-size: 0.9rem;">CHUNK #{number}</span>
+        <span style="color: var(--dp-text-muted); font-size: 0.8rem;">TOPIC: {topic}</span>
+    </div>
+    <p style="color: var(--dp-white); font-size: 1rem; line-height: 1.6;">{text}</p>
+</div>
+"""
+QUIZ_REVIEW_TEMPLATE = """
+<div class="quiz-review" style="border-left-color: {border_color};">
+    <h4>{icon} CHALLENGE #{number}</h4>
+    <p class="quiz-review-question"><strong>QUESTION:</strong> {question}</p>
+    <p style="color: {answer_color};"><strong>YOUR INTEL:</strong> {user_answer}</p>
+    <p style="color: #28a745;"><strong>CORRECT INTEL:</strong> {correct_answer}</p>
+    <div class="quiz-review-take">
+        <p><strong>DEADPOOL'S TAKE:</strong> {explanation}</p>
+    </div>
+</div>
+"""
+
+# Plan status -> badge colour (anything else, e.g. in_progress, gets the default)
+PLAN_STATUS_COLORS = {"pending": "#ffc107", "completed": "#28a745"}
+PLAN_STATUS_DEFAULT_COLOR = "#17a2b8"
+# Quiz review: is_correct -> (border colour, icon)
+REVIEW_MARKS = {True: ("#28a745", "✅"), False: ("#dc3545", "❌")}
+
+PLANNER_ITEM_TEMPLATE = """
+<div class="designer-card-red plan-card" style="transform: rotate({rotate}deg);">
+    <div class="plan-card-row">
+        <div>
+            <span class="plan-date">{date}</span>
+            <h3 class="plan-title">{topic_upper}</h3>
+        </div>
+        <div style="text-align: right;">
+            <span class="plan-status" style="background: {status_color};">{status}</span>
+        </div>
+    </div>
+    <div style="margin-top: 1.5rem; display: flex; gap: 10px;"></div>
+</div>
+"""
+TRAINING_ZONE_TEMPLATE = """
+<div style="background: #000; padding: 2.5rem; border: 10px dashed var(--deadpool-red); margin: 2rem 0; position: relative;">
+    <div style="position: absolute; top: -20px; left: 50%; transform: translateX(-50%); background: var(--deadpool-red); color: white; padding: 5px 30px; font-family: 'Bangers'; font-size: 1.5rem; border: 4px solid #fff;">ACTIVE TRAINING ZONE</div>
+    <h2 class='designer-header' style="font-size: 2.5rem;">TOPIC: {topic_upper}</h2>
+    <div style="background: #1a1a1a; padding: 1.5rem; border-left: 10px solid var(--deadpool-red);">
+        <p style="color: #fff;"><strong>OBJECTIVE:</strong> Master {topic} using all available assets.</p>
+        <hr>
+    </div>
+</div>
+"""
+
+ANALYTICS_TILE_TEMPLATE = '<div style="text-align:center;"><h4 class="designer-header" style="font-size:1rem;">{label}</h4><p style="font-size:2.5rem; font-family:Bangers; color:#fff; margin:0;">{value}</p></div>'
+
+SPACER_HTML = '<div class="spacer"></div>'
+SPACER_SM_HTML = '<div class="spacer-sm"></div>'
+
+FOOTER_HTML = """
+<div style="text-align: center; margin-top: 0rem; padding: 1rem; border-top: 4px solid var(--deadpool-red); background: #000;">
+    <p style="color: #fff; font-family: 'Oswald', sans-serif; font-size: 0.85rem; margin: 0;">© 2025 Deadpool's Study Hub. No regenerating degenerates allowed.</p>
+</div>
+"""
 
 # --- MAIN APP FLOW ---
 def main():
+    # Pick up a background processing run that finished since the last rerun
+    if st.session_state.process_future is not None and st.session_state.process_future.done():
+        _finish_processing()
+    
     # Sidebar
     with st.sidebar:
-        st.markdown("""
-        <div style="text-align: center; padding: 1rem; background: var(--deadpool-red); border: 5px solid #fff; box-shadow: 5px 5px 0px #000; margin-bottom: 2rem; transform: rotate(-2deg);">
-            <h1 style="font-family: 'Bangers'; color: #fff; font-size: 2.5rem; margin: 0; text-shadow: 3px 3px 0px #000;">⚔️ ARSENAL HUB</h1>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
         
         # FANCY NAVIGATION MENU
-        st.markdown("<p style='font-family: \"Bangers\"; font-size: 1.4rem; color: var(--deadpool-red); margin-bottom: 2rem; text-shadow: 2px 2px 0px #000;'>🎯 DESTINATIONS</p>", unsafe_allow_html=True)
+        st.markdown(SIDEBAR_DESTINATIONS_HTML, unsafe_allow_html=True)
         
-        nav_options = {
-            "Home": "🏠",
-            "Flashcards": "📇",
-            "Quizzes": "📝",
-            "Revision Planner": "📅",
-            "Chat Assistant": "💬",
-            "Analytics": "📊"
-        }
-        
-        for page_name, icon in nav_options.items():
-            is_active = st.session_state.current_page == page_name
-            
-            # Sidebar Active Marker (Premium Comic Arrow) - Improved Positioning
-            col_marker, col_btn = st.columns([1.5, 8.5])
-            with col_marker:
-                if is_active:
-                    st.markdown("""
-                        <div style='height: 95px; display: flex; align-items: center; justify-content: flex-end; margin-right: 5px;'>
-                            <div style="font-size: 3.5rem; color: white; filter: drop-shadow(4px 4px 0px #000); line-height: 1;">▶</div>
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown("<div style='height: 95px;'></div>", unsafe_allow_html=True)
-            
-            with col_btn:
-                # Create a stylized button-like container
-                if st.button(f"{icon} {page_name.upper()}", key=f"side_nav_{page_name}", use_container_width=True, type="secondary" if not is_active else "primary"):
-                    st.session_state.current_page = page_name
-                    st.rerun()
+        # One radio bound to current_page (the active option is the marker); _navigate
+        # callbacks elsewhere write the same key before the widget is rebuilt
+        st.radio("DESTINATIONS", NAV_PAGES, format_func=NAV_LABELS.__getitem__,
+                 key="current_page", label_visibility="collapsed")
 
         st.markdown("<div style='margin-bottom: 2rem;'></div>", unsafe_allow_html=True)
         
-        uploaded_files = st.file_uploader(
-            "📎 Upload Study Materials",
-            type=['pdf', 'docx', 'doc', 'txt'],
-            accept_multiple_files=True,
+        _handle_upload(
+            "sidebar_upload_form", "💾 SAVE", "🔄 PROCESS",
             key="sidebar_uploader",
             help="Upload PDF, DOCX, or TXT files"
         )
         
-        # Sync with main page upload
-        if uploaded_files:
-            st.session_state.uploaded_files_shared = uploaded_files
-            st.info(f"📁 {len(uploaded_files)} file(s) selected")
-        elif st.session_state.get('uploaded_files_shared'):
-            st.info(f"📁 {len(st.session_state.uploaded_files_shared)} file(s) from main page")
+        st.markdown("<div style='margin-top: 1rem;'></div>", unsafe_allow_html=True)
         
-        # Use shared files
-        files_to_process_sidebar = uploaded_files if uploaded_files else st.session_state.get('uploaded_files_shared')
+        # Filled in after the page body so saves made anywhere on this run are reflected
+        sidebar_status = st.container()
         
-        if files_to_process_sidebar:
-            docs_dir = ensure_documents_directory()
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("💾 SAVE", use_container_width=True, key="sidebar_save", type="primary"):
-                    saved = 0
-                    saved_files = []
-                    for uploaded_file in files_to_process_sidebar:
-                        file_path = docs_dir / uploaded_file.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
-                            saved += 1
-                            saved_files.append(uploaded_file.name)
-                            # Track upload order
-                            if uploaded_file.name not in st.session_state.document_upload_order:
-                                st.session_state.document_upload_order.append(uploaded_file.name)
-                            else:
-                                # Move to end if already exists (re-upload)
-                                st.session_state.document_upload_order.remove(uploaded_file.name)
-                                st.session_state.document_upload_order.append(uploaded_file.name)
-                    
-                    if saved > 0:
-                        # Update latest document
-                        if saved_files:
-                            st.session_state.latest_document = saved_files[-1]
-                        st.success(f"✅ Saved {saved} file(s)!")
-                        st.session_state.documents_processed = False
-                        st.session_state.uploaded_files_shared = None  # Clear after saving
-                        st.rerun()
-                    else:
-                        st.info("Files already exist.")
-            with col2:
-                if st.button("🔄 PROCESS", use_container_width=True, type="primary", key="sidebar_process"):
-                    # Save first if needed
-                    saved_files = []
-                    for uploaded_file in files_to_process_sidebar:
-                        file_path = docs_dir / uploaded_file.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
-                            saved_files.append(uploaded_file.name)
-                            # Track upload order
-                            if uploaded_file.name not in st.session_state.document_upload_order:
-                                st.session_state.document_upload_order.append(uploaded_file.name)
-                            else:
-                                # Move to end if already exists (re-upload)
-                                st.session_state.document_upload_order.remove(uploaded_file.name)
-                                st.session_state.document_upload_order.append(uploaded_file.name)
-                    
-                    # Update latest document before processing
-                    if saved_files:
-                        st.session_state.latest_document = saved_files[-1]
-                    
-                    if process_documents():
-                        st.session_state.uploaded_files_shared = None  # Clear after processing
-                        # Show summary in sidebar
-                        if 'processing_results' in st.session_state:
-                            result = st.session_state.processing_results
-                            st.success(f"✅ {result['total_chunks']} chunks, {result['total_topics']} topics!")
-                        st.rerun()
+        st.divider()
         
-        st.markdown("<div style='margin-top: 1rem;'></div>", unsafe_allow_html=True)
+    # Main Content Area
+    render_page = PAGE_RENDERERS.get(st.session_state.current_page)
+    if render_page:
+        render_page()
+
+    with sidebar_status:
+        if st.session_state.process_future is not None:
+            _processing_monitor()
         
         doc_files = get_document_files()
         if doc_files:
             st.info(f"📁 {len(doc_files)} document(s) in arsenal")
         
         if st.session_state.vector_store:
-            count = st.session_state.vector_store.get_collection_count()
+            count = _cached_chunk_count(st.session_state.vector_store.version)
             st.metric("INDEXED CHUNKS", count)
-        
-        st.divider()
-        
-    # Main Content Area
-    if st.session_state.current_page == "Home":
-        show_home_page()
-    elif st.session_state.current_page == "Flashcards":
-        show_flashcards_page()
-    elif st.session_state.current_page == "Quizzes":
-        show_quizzes_page()
-    elif st.session_state.current_page == "Revision Planner":
-        show_planner_page()
-    elif st.session_state.current_page == "Chat Assistant":
-        show_chat_page()
-    elif st.session_state.current_page == "Analytics":
-        show_analytics_page()
 
     # Footer - Removed extra space
-    st.markdown("""
-    <div style="text-align: center; margin-top: 0rem; padding: 1rem; border-top: 4px solid var(--deadpool-red); background: #000;">
-        <p style="color: #fff; font-family: 'Oswald', sans-serif; font-size: 0.85rem; margin: 0;">© 2025 Deadpool's Study Hub. No regenerating degenerates allowed.</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
         
 def show_home_page():
     """Deadpool-themed Home page with Designer Visuals"""
     
     # Hero Section - Refined
-    st.markdown("""
-    <div style="
-        background: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.8)), url('https://w0.peakpx.com/wallpaper/744/403/HD-wallpaper-deadpool-marvel-comic.jpg') center/cover;
-        padding: 5rem 2rem;
-        border-bottom: 4px solid var(--dp-red-primary);
-        box-shadow: 0px 10px 30px rgba(0,0,0,0.5);
-        text-align: center;
-        margin-bottom: 3rem;
-        position: relative;
-    ">
-        <div style="position: relative; z-index: 2;">
-            <h1 style="font-size: 4.5rem; color: #fff; text-shadow: 4px 4px 0px var(--dp-red-primary); margin: 0; letter-spacing: 2px;">WEAPONIZED KNOWLEDGE</h1>
-            <div style="
-                font-family: 'Oswald', sans-serif;
-                background: var(--dp-red-primary);
-                color: #fff;
-                font-size: 1.5rem;
-                font-weight: 700;
-                display: inline-block;
-                padding: 0.5rem 2rem;
-                transform: skew(-10deg);
-                margin-top: 1.5rem;
-                box-shadow: 5px 5px 0px #000;
-            ">
-                MAXIMUM EFFORT. MINIMUM STUDYING.
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(HOME_HERO_HTML, unsafe_allow_html=True)
         
     # CASE 1: NEW USER EXPERIENCE (High-Impact Onboarding)
     if not st.session_state.documents_processed:
@@ -598,62 +715,15 @@ def show_home_page():
             </div>
             """, unsafe_allow_html=True)
 
-        st.markdown("<br>", unsafe_allow_html=True)
-        
         # Arsenal Portal (Upload Zone)
-        st.markdown("""
-            <div class="sexy-drop-zone" style="background: var(--dp-dark-gray); border: 2px dashed var(--dp-red-primary); padding: 3rem; text-align: center; position: relative;">
-                <h2 style="color: var(--dp-red-primary); margin-bottom: 1rem;">CLASSIFIED ARCHIVES</h2>
-                <p style="font-size: 1.2rem; color: var(--dp-white); margin-bottom: 2rem;">DROP YOUR BRAIN JUICE HERE!</p>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(SPACER_HTML + ONBOARDING_DROP_ZONE_HTML, unsafe_allow_html=True)
         
-        uploaded_files_main = st.file_uploader(
-            "📎 Choose files to upload",
-            type=['pdf', 'docx', 'doc', 'txt'],
-            accept_multiple_files=True,
+        _handle_upload(
+            "onboarding_upload_form", "💾 SAVE TARGETS", "🔄 PROCESS MISSION",
+            label="📎 Choose files to upload",
             key="main_uploader_onboarding",
             label_visibility="collapsed"
         )
-        
-        # Save and Process logic for onboarding
-        if uploaded_files_main:
-            st.session_state.uploaded_files_shared = uploaded_files_main
-            
-            f_count = len(uploaded_files_main)
-            st.markdown(f"""
-            <div style="background: #A80000; color: white; padding: 10px; border: 3px solid #000; text-align: center; font-family: 'Bangers'; transform: rotate(2deg); box-shadow: 5px 5px 0px #000; margin-bottom: 1rem;">
-                ✅ {f_count} TARGETS LOCKED! READY FOR SLICING!
-            </div>
-            """, unsafe_allow_html=True)
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("💾 SAVE TARGETS", use_container_width=True, type="primary", key="save_main_onboard"):
-                    docs_dir = ensure_documents_directory()
-                    saved = 0
-                    for f in uploaded_files_main:
-                        file_path = docs_dir / f.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as pf:
-                                pf.write(f.getbuffer())
-                            saved += 1
-                    if saved > 0:
-                        st.success(f"✅ Saved {saved} files!")
-                    st.session_state.documents_processed = False
-                    st.rerun()
-            with col2:
-                if st.button("🔄 PROCESS MISSION", use_container_width=True, type="primary", key="process_main_onboard"):
-                    # Save first
-                    docs_dir = ensure_documents_directory()
-                    for f in uploaded_files_main:
-                        file_path = docs_dir / f.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as pf:
-                                pf.write(f.getbuffer())
-                    if process_documents():
-                        st.session_state.uploaded_files_shared = None
-                        st.rerun()
         return
 
     # CASE 2: RETURNING USER (Pro Dashboard)
@@ -670,9 +740,7 @@ def show_home_page():
             <p style="color: #fff !important; text-transform: uppercase; margin-bottom: 1.5rem; font-size: 1.1rem;">WEAPONIZED FLASHCARDS FOR RAPID INTEL RETENTION.</p>
             <p style="font-family: 'Bangers'; font-size: 1.3rem; text-align: center; color: #fff !important; text-shadow: 2px 2px 0px #000;">CLICK TO ACCESS →</p>
         """, unsafe_allow_html=True)
-        if st.button("📇 FLASHCARDS", key="dash_flash", use_container_width=True, type="primary"):
-            st.session_state.current_page = "Flashcards"
-            st.rerun()
+        st.button("📇 FLASHCARDS", key="dash_flash", use_container_width=True, type="primary", on_click=_navigate, args=("Flashcards",))
         st.markdown("</div>", unsafe_allow_html=True)
 
     with col2:
@@ -684,9 +752,7 @@ def show_home_page():
             <p style="color: #fff !important; text-transform: uppercase; margin-bottom: 1.5rem; font-size: 1.1rem;">TEST YOUR COMBAT READINESS WITH CUSTOMIZED CHALLENGES.</p>
             <p style="font-family: 'Bangers'; font-size: 1.3rem; text-align: center; color: #fff !important; text-shadow: 2px 2px 0px #000;">CLICK TO INITIATE →</p>
         """, unsafe_allow_html=True)
-        if st.button("📝 QUIZ", key="dash_quiz", use_container_width=True, type="primary"):
-            st.session_state.current_page = "Quizzes"
-            st.rerun()
+        st.button("📝 QUIZ", key="dash_quiz", use_container_width=True, type="primary", on_click=_navigate, args=("Quizzes",))
         st.markdown("</div>", unsafe_allow_html=True)
 
     col3, col4 = st.columns(2)
@@ -699,9 +765,7 @@ def show_home_page():
             <p style="color: #fff !important; text-transform: uppercase; margin-bottom: 1.5rem; font-size: 1.1rem;">INTERROGATE THE AI FOR DEEP SEMANTIC INSIGHTS.</p>
             <p style="font-family: 'Bangers'; font-size: 1.3rem; text-align: center; color: #fff !important; text-shadow: 2px 2px 0px #000;">CLICK TO INTERROGATE →</p>
         """, unsafe_allow_html=True)
-        if st.button("💬 CHAT ASSISTANT", key="dash_chat", use_container_width=True, type="primary"):
-            st.session_state.current_page = "Chat Assistant"
-            st.rerun()
+        st.button("💬 CHAT ASSISTANT", key="dash_chat", use_container_width=True, type="primary", on_click=_navigate, args=("Chat Assistant",))
         st.markdown("</div>", unsafe_allow_html=True)
 
     with col4:
@@ -713,9 +777,7 @@ def show_home_page():
             <p style="color: #fff !important; text-transform: uppercase; margin-bottom: 1.5rem; font-size: 1.1rem;">STRATEGIZE YOUR LEARNING JOURNEY WITH A TIMELINE.</p>
             <p style="font-family: 'Bangers'; font-size: 1.3rem; text-align: center; color: #fff !important; text-shadow: 2px 2px 0px #000;">CLICK TO VIEW →</p>
         """, unsafe_allow_html=True)
-        if st.button("📅 REVISION PLANNER", key="dash_plan", use_container_width=True, type="primary"):
-            st.session_state.current_page = "Revision Planner"
-            st.rerun()
+        st.button("📅 REVISION PLANNER", key="dash_plan", use_container_width=True, type="primary", on_click=_navigate, args=("Revision Planner",))
         st.markdown("</div>", unsafe_allow_html=True)
 
     col5, _ = st.columns([1, 1])
@@ -728,77 +790,35 @@ def show_home_page():
             <p style="color: #fff !important; text-transform: uppercase; margin-bottom: 1.5rem; font-size: 1.1rem;">TRACK YOUR STUDY EFFICIENCY AND VICTORY RATES.</p>
             <p style="font-family: 'Bangers'; font-size: 1.3rem; text-align: center; color: #fff !important; text-shadow: 2px 2px 0px #000;">CLICK TO ANALYZE →</p>
         """, unsafe_allow_html=True)
-        if st.button("📊 ANALYTICS", key="dash_analytics", use_container_width=True, type="primary"):
-            st.session_state.current_page = "Analytics"
-            st.rerun()
+        st.button("📊 ANALYTICS", key="dash_analytics", use_container_width=True, type="primary", on_click=_navigate, args=("Analytics",))
         st.markdown("</div>", unsafe_allow_html=True)
     
     # Add Mission Portal to Command Center for completeness
-    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(SPACER_HTML, unsafe_allow_html=True)
     with st.expander("🛠️ ARSENAL PORTAL (UPLOAD & MANAGE INTEL)", expanded=False):
-        st.markdown("""
-        <div style="background: var(--dp-dark-gray); padding: 2rem; border: 3px dashed var(--dp-red-primary);">
-            <p style="color: var(--dp-white); font-family: 'Bangers'; font-size: 1.5rem; text-align: center; margin-bottom: 1rem;">NEED MORE AMMO? DROP IT HERE!</p>
-        </div>
-        """, unsafe_allow_html=True)
-        uploaded_files_dash = st.file_uploader(
-            "📎 Add more intel to your arsenal",
-            type=['pdf', 'docx', 'doc', 'txt'],
-            accept_multiple_files=True,
+        st.markdown(DASH_DROP_ZONE_HTML, unsafe_allow_html=True)
+        _handle_upload(
+            "dash_upload_form", "💾 LOCK & LOAD", "🔄 MAXIMUM EFFORT (PROCESS)",
+            rerun_on_save=True,
+            label="📎 Add more intel to your arsenal",
             key="dash_uploader",
             label_visibility="collapsed"
         )
-        if uploaded_files_dash:
-            st.session_state.uploaded_files_shared = uploaded_files_dash
-            f_count = len(uploaded_files_dash)
-            st.markdown(f"""
-            <div style="background: var(--dp-red-primary); color: white; padding: 10px; border: 3px solid #fff; text-align: center; font-family: 'Bangers'; box-shadow: 5px 5px 0px #000; margin: 1rem 0;">
-                ✅ {f_count} NEW TARGETS DETECTED! PREPARE TO SLICE!
-        </div>
-        """, unsafe_allow_html=True)
-        
-            c1, c2 = st.columns(2)
-            with c1:
-                if st.button("💾 LOCK & LOAD", use_container_width=True, type="primary", key="save_dash"):
-                    docs_dir = ensure_documents_directory()
-                    saved = 0
-                    for f in uploaded_files_dash:
-                        file_path = docs_dir / f.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as pf:
-                                pf.write(f.getbuffer())
-                            saved += 1
-                    if saved > 0:
-                        st.success(f"✅ Saved {saved} files!")
-                        st.session_state.documents_processed = False
-                        st.rerun()
-            with c2:
-                if st.button("🔄 MAXIMUM EFFORT (PROCESS)", use_container_width=True, type="primary", key="process_dash"):
-                    docs_dir = ensure_documents_directory()
-                    for f in uploaded_files_dash:
-                        file_path = docs_dir / f.name
-                        if not file_path.exists():
-                            with open(file_path, "wb") as pf:
-                                pf.write(f.getbuffer())
-                    if process_documents():
-                        st.session_state.uploaded_files_shared = None
-                        st.rerun()
     
-    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(SPACER_HTML, unsafe_allow_html=True)
     
     # 2. Performance Stats
     if st.session_state.agent_controller:
         stats = st.session_state.agent_controller.get_statistics()
         st.markdown("<h3 class='designer-header'>📊 MISSION INTEL</h3>", unsafe_allow_html=True)
-        c1, c2, c3, c4 = st.columns(4)
-        with c1: 
-            st.markdown(f'<div class="designer-card-red" style="text-align: center; padding: 1.5rem !important; margin-bottom: 1rem !important;"><h4 style="font-size: 1rem; color: #fff; margin: 0;">TOPICS</h4><p style="font-size: 2.5rem; font-family: Bangers; color: #fff; margin: 0; text-shadow: 2px 2px 0px #000;">{stats["total_topics"]}</p></div>', unsafe_allow_html=True)
-        with c2: 
-            st.markdown(f'<div class="designer-card-red" style="text-align: center; padding: 1.5rem !important; margin-bottom: 1rem !important;"><h4 style="font-size: 1rem; color: #fff; margin: 0;">CARDS</h4><p style="font-size: 2.5rem; font-family: Bangers; color: #fff; margin: 0; text-shadow: 2px 2px 0px #000;">{stats["total_flashcards"]}</p></div>', unsafe_allow_html=True)
-        with c3: 
-            st.markdown(f'<div class="designer-card-red" style="text-align: center; padding: 1.5rem !important; margin-bottom: 1rem !important;"><h4 style="font-size: 1rem; color: #fff; margin: 0;">QUIZZES</h4><p style="font-size: 2.5rem; font-family: Bangers; color: #fff; margin: 0; text-shadow: 2px 2px 0px #000;">{stats["total_quizzes"]}</p></div>', unsafe_allow_html=True)
-        with c4: 
-            st.markdown(f'<div class="designer-card-red" style="text-align: center; padding: 1.5rem !important; margin-bottom: 1rem !important;"><h4 style="font-size: 1rem; color: #fff; margin: 0;">WIN RATE</h4><p style="font-size: 2.5rem; font-family: Bangers; color: #fff; margin: 0; text-shadow: 2px 2px 0px #000;">{stats["revision_stats"]["completion_rate"]:.1f}%</p></div>', unsafe_allow_html=True)
+        # One element for all four cards (CSS grid) instead of four columns/markdown calls
+        metric_cards = "".join(INTEL_CARD_TEMPLATE.format(label=label, value=value) for label, value in (
+            ("TOPICS", stats["total_topics"]),
+            ("CARDS", stats["total_flashcards"]),
+            ("QUIZZES", stats["total_quizzes"]),
+            ("WIN RATE", f'{stats["revision_stats"]["completion_rate"]:.1f}%'),
+        ))
+        st.markdown(f'<div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;">{metric_cards}</div>', unsafe_allow_html=True)
 
     st.divider()
 
@@ -810,56 +830,56 @@ def show_home_page():
         with col_topics:
             if p_result.get('topics'):
                 st.markdown("<h3 class='designer-header' style='font-size: 2rem;'>📚 WEAPONIZED TOPICS</h3>", unsafe_allow_html=True)
-                for idx, topic_data in enumerate(p_result['topics'][:5], 1):
-                    with st.expander(f"🔴 {topic_data.get('topic', 'Topic').upper()}", expanded=(idx == 1)):
-                        st.markdown(f"""
-                        <div style="background: var(--dp-dark-gray); padding: 1.5rem; border-left: 4px solid var(--dp-red-primary); margin-bottom: 10px;">
-                            {''.join([f"<p style='color: var(--dp-text-muted); margin-bottom: 8px;'>⚔️ {p}</p>" for p in topic_data.get('key_points', [])[:3]])}
-                        </div>
-                        """, unsafe_allow_html=True)
+                # Key points are joined once per processing result, not on every rerun;
+                # LLM text is escaped so one stray '<' can't swallow the topics after it
+                topics_html = p_result.get('_topics_html')
+                if topics_html is None:
+                    topics_html = p_result['_topics_html'] = "".join(
+                        TOPIC_REVEAL_TEMPLATE.format(
+                            open=" open" if idx == 1 else "",
+                            topic=html.escape(str(topic_data.get('topic', 'Topic')).upper()),
+                            points="".join(TOPIC_POINT_TEMPLATE.format(html.escape(str(p))) for p in topic_data.get('key_points', [])[:3]),
+                        )
+                        for idx, topic_data in enumerate(p_result['topics'][:5], 1)
+                    )
+                st.markdown(topics_html, unsafe_allow_html=True)
         
         with col_samples:
             st.markdown("<h3 class='designer-header' style='font-size: 2rem;'>📄 INTEL SNAPS</h3>", unsafe_allow_html=True)
             if p_result.get('flashcard_samples'):
                 with st.expander("📇 SAMPLE CARDS", expanded=True):
-                    for fs in p_result['flashcard_samples'][:2]:
-                        st.markdown(f"""
-                        <div style="background: #fff; padding: 1.5rem; border: 3px solid #000; margin-bottom: 15px; box-shadow: 6px 6px 0px var(--dp-red-primary);">
-                            <p style="color: #000; font-size: 1.1rem; font-weight: 700; margin-bottom: 8px;"><b>Q:</b> {fs['question']}</p>
-                            <hr style="margin: 8px 0; border-color: #000; border-width: 2px;">
-                            <p style="color: #333; font-size: 1rem;"><b>A:</b> {fs['answer']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    st.markdown("".join(
+                        SAMPLE_CARD_TEMPLATE.format(question=html.escape(fs['question']), answer=html.escape(fs['answer']))
+                        for fs in p_result['flashcard_samples'][:2]
+                    ), unsafe_allow_html=True)
             
             if p_result.get('quiz_samples'):
                 with st.expander("📝 SAMPLE CHALLENGES", expanded=False):
                     for qs in p_result['quiz_samples'][:2]:
                         st.markdown(f"""
                         <div style="background: var(--dp-red-primary); padding: 1.5rem; border: 3px solid #fff; margin-bottom: 15px; box-shadow: 6px 6px 0px #000;">
-                            <p style="color: #fff; font-size: 1.1rem; font-weight: 700;">{qs['question']}</p>
+                            <p style="color: #fff; font-size: 1.1rem; font-weight: 700;">{html.escape(qs['question'])}</p>
                         </div>
                         """, unsafe_allow_html=True)
 
         # 4. Detailed Extracted Intel (Chunks)
-        st.markdown("<br>", unsafe_allow_html=True)
-        st.markdown("<h3 class='designer-header'>🧬 DETAILED EXTRACTED INTEL</h3>", unsafe_allow_html=True)
+        st.markdown(SPACER_HTML + "<h3 class='designer-header'>🧬 DETAILED EXTRACTED INTEL</h3>", unsafe_allow_html=True)
         if p_result.get('chunks'):
             with st.expander(f"VIEW {len(p_result['chunks'])} KNOWLEDGE CHUNKS IN DETAIL"):
-                for i, chunk in enumerate(p_result['chunks']):
-                    st.markdown(f"""
-                    <div class="designer-card" style="padding: 1.5rem !important; border-left: 6px solid var(--dp-red-primary); margin-bottom: 1.5rem;">
-                        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
-                            <span style="background: var(--dp-red-primary); color: white; padding: 2px 10px; font-family: 'Bangers'; font-size: 0.9rem;">CHUNK #{i+1}</span>
-                            <span style="color: var(--dp-text-muted); font-size: 0.8rem;">TOPIC: {chunk.get('metadata', {}).get('topic', 'General').upper()}</span>
-                        </div>
-                        <p style="color: var(--dp-white); font-size: 1rem; line-height: 1.6;">{chunk.get('text', '')}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                # Raw document text (code, maths) shares one element, so it's escaped
+                st.markdown("".join(
+                    CHUNK_CARD_TEMPLATE.format(
+                        number=i + 1,
+                        topic=html.escape(str(chunk.get('metadata', {}).get('topic', 'General')).upper()),
+                        text=html.escape(chunk.get('text', '')),
+                    )
+                    for i, chunk in enumerate(p_result['chunks'])
+                ), unsafe_allow_html=True)
         else:
             st.info("No detailed chunks found. Processing might have failed.")
 
     # 5. Pro Tips with Deadpool Flavor
-    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(SPACER_HTML, unsafe_allow_html=True)
     with st.container():
         st.markdown("""
         <div class="designer-card-red" style="background: var(--deadpool-black) !important; border: 8px solid var(--deadpool-red) !important; transform: rotate(0.5deg) skew(0.5deg); box-shadow: 25px 25px 0px #000 !important;">
@@ -900,13 +920,13 @@ def show_flashcards_page():
         with col2:
             difficulty_mix_label = st.selectbox(
                 "DIFFICULTY MIX",
-                ["Easy + Medium", "Medium + Hard", "Easy + Medium + Hard"],
+                DIFFICULTY_MIX_LABELS,
                 index=2
             )
-            mix_map = {"Easy + Medium": "easy_medium", "Medium + Hard": "medium_hard", "Easy + Medium + Hard": "easy_medium_hard"}
-            difficulty_mix = mix_map.get(difficulty_mix_label, "easy_medium_hard")
+            difficulty_mix = DIFFICULTY_MIX_MAP.get(difficulty_mix_label, "easy_medium_hard")
+            fresh = st.checkbox("🎲 FRESH BATCH", key="flashcards_fresh", help="Generate new cards even if these settings were used before")
         with col3:
-            st.markdown("<br>", unsafe_allow_html=True)
+            st.markdown(SPACER_HTML, unsafe_allow_html=True)
             if st.button("🔄 GENERATE ARSENAL", use_container_width=True, type="primary"):
                 processing_msg = st.info("Deadpool is thinking (mostly about tacos and world peace... nah, just tacos)...")
                 try:
@@ -919,13 +939,17 @@ def show_flashcards_page():
                         st.error("⚠️ No document content found! Please upload and process documents first.")
                         logger.warning("Flashcard generation failed: No chunks in memory")
                     else:
-                        flashcards = st.session_state.agent_controller.generate_flashcards(num_flashcards, difficulty_mix=difficulty_mix)
+                        controller = st.session_state.agent_controller
+                        flashcards = _generate_cached(
+                            "flashcards", controller.generate_flashcards,
+                            num_flashcards, difficulty_mix=difficulty_mix,
+                            fresh=fresh, record=controller.memory.add_flashcards
+                        )
                         processing_msg.empty()
                         
                         if flashcards and len(flashcards) > 0:
                             st.session_state.flashcards = flashcards
                             logger.info(f"Flashcards generated successfully: {len(flashcards)} cards")
-                            st.rerun()
                         else:
                             st.warning("⚠️ Could not generate flashcards. Try processing more documents.")
                             logger.warning("Flashcard generation returned empty list")
@@ -949,7 +973,7 @@ def show_flashcards_page():
     if st.session_state.flashcards:
         st.markdown(f'<h3 class="designer-header" style="font-size: 2.5rem;">📚 {len(st.session_state.flashcards)} CARDS IN YOUR ARSENAL</h3>', unsafe_allow_html=True)
         
-        csv_data = st.session_state.agent_controller.flashcard_agent.export_to_csv(st.session_state.flashcards)
+        csv_data = _cached_csv("flashcards", st.session_state.flashcards, st.session_state.agent_controller.flashcard_agent.export_to_csv)
         st.download_button(
             label="📥 EXPORT MISSION INTEL (CSV)",
             data=csv_data,
@@ -959,24 +983,20 @@ def show_flashcards_page():
             key="export_flash_csv"
         )
         
-        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(SPACER_HTML, unsafe_allow_html=True)
         
-        for i, card in enumerate(st.session_state.flashcards):
-            st.markdown(f"""
-            <div class="designer-card-red" style="transform: rotate({(i%2)*0.8 - 0.4}deg); border-width: 10px !important; padding: 2.5rem !important; margin-bottom: 0px !important; box-shadow: 15px 15px 0px #000 !important;">
-                <div style="position: relative; z-index: 10;">
-                    <h4 class="designer-header" style="font-size: 1.8rem !important; padding: 5px 20px !important; background: #000; border: 4px solid #fff;">CARD #{i+1} — {card.get('difficulty', 'medium').upper()}</h4>
-                    <p style="font-size: 2.2rem; font-weight: 900; margin: 25px 0; color: #fff; line-height: 1.2; font-family: 'Bangers', cursive !important; text-shadow: 4px 4px 0px #000; letter-spacing: 1.5px;">Q: {card['question']}</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            with st.expander("👀 REVEAL CLASSIFIED INTEL (ANSWER)", expanded=False):
-                st.markdown(f"""
-                <div style="background: #fff; padding: 2.5rem; border: 10px solid #000; outline: 5px solid var(--deadpool-red); margin-top: -10px; box-shadow: 20px 20px 0px #000 !important; transform: rotate({(i%2)*-0.5 + 0.25}deg);">
-                    <p style="font-size: 1.6rem; color: #000; font-family: 'Oswald', sans-serif; line-height: 1.5; font-weight: 900; text-transform: uppercase;">{card['answer']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            st.markdown('<div style="height: 50px;"></div>', unsafe_allow_html=True)
+        # All cards in one element; answers use native <details> instead of one st.expander per card.
+        # Card text is LLM output, so it is escaped before going into the shared HTML string.
+        st.markdown("".join(
+            COMIC_CARD_TEMPLATE.format(
+                rotate=(i % 2) * 0.8 - 0.4, margin="1rem",
+                title=f"CARD #{i+1} — {card.get('difficulty', 'medium').upper()}", question=html.escape(card['question']),
+            )
+            + FLASHCARD_REVEAL_TEMPLATE.format(
+                answer=FLASHCARD_ANSWER_TEMPLATE.format(rotate=(i % 2) * -0.5 + 0.25, answer=html.escape(card['answer']))
+            )
+            for i, card in enumerate(st.session_state.flashcards)
+        ), unsafe_allow_html=True)
     else:
         st.info("Click 'GENERATE' to create flashcards from your study materials!")
 
@@ -1001,8 +1021,9 @@ def show_quizzes_page():
             difficulty = st.selectbox("INTEL DIFFICULTY", ["easy", "medium", "hard"], index=1)
         with col2:
             num_questions = st.slider("TARGET QUESTIONS", 3, 30, value=st.session_state.num_questions, key="quiz_slider")
+            fresh = st.checkbox("🎲 FRESH BATCH", key="quiz_fresh", help="Generate new questions even if these settings were used before")
         with col3:
-            st.markdown("<br>", unsafe_allow_html=True)
+            st.markdown(SPACER_HTML, unsafe_allow_html=True)
             if st.button("🎯 INITIATE QUIZ", use_container_width=True, type="primary"):
                 processing_msg = st.info("Drafting questions... mostly about you failing... and maybe some tacos...")
                 try:
@@ -1015,7 +1036,14 @@ def show_quizzes_page():
                         st.error("⚠️ No document content found! Please upload and process documents first.")
                         logger.warning("Quiz generation failed: No chunks in memory")
                     else:
-                        questions = st.session_state.agent_controller.generate_quiz(difficulty, num_questions, True)
+                        controller = st.session_state.agent_controller
+                        # Adaptive mode reads the score history, so each submitted quiz starts a new key
+                        questions = _generate_cached(
+                            "quiz", controller.generate_quiz,
+                            difficulty, num_questions, True,
+                            fresh=fresh, record=controller.memory.add_quizzes,
+                            state=len(controller.memory.user_performance['quiz_scores'])
+                        )
                         processing_msg.empty()
                         
                         if questions and len(questions) > 0:
@@ -1025,7 +1053,6 @@ def show_quizzes_page():
                             st.session_state.quiz_submitted = False
                             st.session_state.quiz_result = None
                             logger.info(f"Quiz generated successfully: {len(questions)} questions")
-                            st.rerun()
                         else:
                             st.warning("⚠️ Could not generate quiz questions. Try adjusting difficulty or processing more documents.")
                             logger.warning("Quiz generation returned empty list")
@@ -1039,48 +1066,46 @@ def show_quizzes_page():
     if st.session_state.quizzes:
         st.markdown(f'<h3 class="designer-header" style="font-size: 2.5rem;">📋 {len(st.session_state.quizzes)} CHALLENGES STANDING BETWEEN YOU AND VICTORY</h3>', unsafe_allow_html=True)
         
-        csv_data = st.session_state.agent_controller.quiz_agent.export_to_csv(st.session_state.quizzes)
+        csv_data = _cached_csv("quizzes", st.session_state.quizzes, st.session_state.agent_controller.quiz_agent.export_to_csv)
         st.download_button(label="📥 DOWNLOAD MISSION DEBRIEF (CSV)", data=csv_data, file_name="quiz_questions.csv", mime="text/csv", use_container_width=True, key="download_quiz_csv")
         
-        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(SPACER_HTML, unsafe_allow_html=True)
         
-        for i, q in enumerate(st.session_state.quizzes):
-            st.markdown(f"""
-            <div class="designer-card-red" style="transform: rotate({(i%2)*0.8 - 0.4}deg); border-width: 10px !important; padding: 2.5rem !important; margin-bottom: 0px !important; box-shadow: 15px 15px 0px #000 !important;">
-                <div style="position: relative; z-index: 10;">
-                    <h4 class="designer-header" style="font-size: 1.8rem !important; padding: 5px 20px !important; background: #000; border: 4px solid #fff;">QUESTION #{i+1}</h4>
-                    <p style="font-size: 2.2rem; font-weight: 900; margin: 25px 0; color: #fff; line-height: 1.2; font-family: 'Bangers', cursive !important; text-shadow: 4px 4px 0px #000; letter-spacing: 1.5px;">Q: {q['question']}</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        # Answers are batched in a form: picking options doesn't rerun the page, only SUBMIT does
+        with st.form("quiz_form", clear_on_submit=False, border=False):
+            for i, q in enumerate(st.session_state.quizzes):
+                # Gap after the previous question's options rides along in this question's card markup
+                st.markdown((SPACER_SM_HTML if i else "") + COMIC_CARD_TEMPLATE.format(
+                    rotate=(i % 2) * 0.8 - 0.4, margin="0px", title=f"QUESTION #{i+1}", question=html.escape(q['question']),
+                ), unsafe_allow_html=True)
+                
+                # Options using styled st.radio
+                # Radio over option indices: the answer is the value itself, no .index() scan,
+                # and duplicate option text can't collapse onto the first match
+                options = q['options']
+                selected = st.radio(
+                    f"Options for Q{i+1}:",
+                    range(len(options)),
+                    format_func=options.__getitem__,
+                    key=f"quiz_q{i}",
+                    label_visibility="collapsed"
+                )
+                st.session_state.quiz_answers[i] = -1 if selected is None else selected
+            st.markdown(SPACER_SM_HTML, unsafe_allow_html=True)
             
-            # Options using styled st.radio
-            selected = st.radio(
-                f"Options for Q{i+1}:",
-                q['options'],
-                key=f"quiz_q{i}",
-                label_visibility="collapsed"
-            )
-            st.session_state.quiz_answers[i] = q['options'].index(selected) if selected in q['options'] else -1
-            st.markdown('<div style="height: 10px;"></div>', unsafe_allow_html=True)
-
-        # Persistence for quiz results
-        if 'quiz_submitted' not in st.session_state:
-            st.session_state.quiz_submitted = False
-        if 'quiz_result' not in st.session_state:
-            st.session_state.quiz_result = None
-
-        if not st.session_state.quiz_submitted:
-            if st.button("✅ SUBMIT MISSION INTEL", type="primary", use_container_width=True):
-                with st.spinner("Analyzing your answers... trying not to laugh..."):
-                    try:
-                        q_result = st.session_state.agent_controller.evaluate_quiz(st.session_state.quizzes, st.session_state.quiz_answers)
-                        st.session_state.quiz_result = q_result
-                        st.session_state.quiz_submitted = True
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"⚠️ Tactical Error during evaluation: {e}")
-                        logger.exception("Quiz evaluation failed")
+            submitted = st.form_submit_button("✅ SUBMIT MISSION INTEL", type="primary", use_container_width=True,
+                                              disabled=st.session_state.quiz_submitted)
+
+        if submitted and not st.session_state.quiz_submitted:
+            with st.spinner("Analyzing your answers... trying not to laugh..."):
+                try:
+                    q_result = st.session_state.agent_controller.evaluate_quiz(st.session_state.quizzes, st.session_state.quiz_answers)
+                    st.session_state.quiz_result = q_result
+                    st.session_state.quiz_submitted = True
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"⚠️ Tactical Error during evaluation: {e}")
+                    logger.exception("Quiz evaluation failed")
         
         if st.session_state.quiz_submitted and st.session_state.quiz_result:
             q_result = st.session_state.quiz_result
@@ -1096,30 +1121,58 @@ def show_quizzes_page():
             </div>
             """, unsafe_allow_html=True)
 
-            if st.button("🔄 RETAKE MISSION (RESET)", use_container_width=True):
-                st.session_state.quiz_submitted = False
-                st.session_state.quiz_result = None
-                st.session_state.quiz_answers = {}
-                st.rerun()
+            st.button("🔄 RETAKE MISSION (RESET)", use_container_width=True, on_click=_reset_quiz)
 
             # Detailed Review
             st.markdown("<h3 class='designer-header' style='font-size: 2.5rem;'>📋 AFTER-ACTION REPORT</h3>", unsafe_allow_html=True)
-            for i, rev in enumerate(q_result.get('details', [])):
-                is_correct = rev['is_correct']
-                border_color = "#28a745" if is_correct else "#dc3545"
-                icon = "✅" if is_correct else "❌"
-                
-                st.markdown(f"""
-                <div style="background: #1a1a1a; padding: 2rem; border-left: 15px solid {border_color}; margin-bottom: 2rem; box-shadow: 10px 10px 0px #000;">
-                    <h4 style="color: #fff; font-family: 'Bangers'; font-size: 1.5rem; margin-bottom: 1rem;">{icon} CHALLENGE #{i+1}</h4>
-                    <p style="color: #eee; font-family: 'Oswald'; font-size: 1.2rem;"><strong>QUESTION:</strong> {rev['question']}</p>
-                    <p style="color: {score_color if is_correct else '#dc3545'}; font-family: 'Oswald';"><strong>YOUR INTEL:</strong> {rev['user_answer']}</p>
-                    <p style="color: #28a745; font-family: 'Oswald';"><strong>CORRECT INTEL:</strong> {rev['correct_answer']}</p>
-                    <div style="background: rgba(255,255,255,0.05); padding: 1rem; margin-top: 1rem; border: 1px dashed #444;">
-                        <p style="color: #aaa; font-style: italic; margin: 0; font-family: 'Oswald';"><strong>DEADPOOL'S TAKE:</strong> {rev['explanation']}</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            # Whole report in one markdown element, built once per result rather than on every rerun;
+            # question/answer/explanation text is model output, so it's escaped
+            report_html = q_result.get('_report_html')
+            if report_html is None:
+                report_html = q_result['_report_html'] = "".join(
+                    QUIZ_REVIEW_TEMPLATE.format(
+                        border_color=REVIEW_MARKS[rev['is_correct']][0],
+                        icon=REVIEW_MARKS[rev['is_correct']][1],
+                        number=i + 1,
+                        question=html.escape(str(rev['question'])),
+                        answer_color=score_color if rev['is_correct'] else REVIEW_MARKS[False][0],
+                        user_answer=html.escape(str(rev['user_answer'])),
+                        correct_answer=html.escape(str(rev['correct_answer'])),
+                        explanation=html.escape(str(rev['explanation'])),
+                    )
+                    for i, rev in enumerate(q_result.get('details', []))
+                )
+            st.markdown(report_html, unsafe_allow_html=True)
+
+@st.fragment
+def _render_plan_item(i: int, item: Dict):
+    """One plan card + status buttons; a status change reruns only this card, not the whole plan."""
+    item_date = item.get('date', 'TBD')
+    item_topic = item.get('topic', 'General Study')
+    status = item.get('status', 'pending')
+    
+    # Pure HTML chrome: st.html skips the markdown parser entirely
+    st.html(PLANNER_ITEM_TEMPLATE.format(
+        rotate=(i % 2) * 0.5 - 0.25, date=html.escape(str(item_date)), topic_upper=html.escape(item_topic.upper()),
+        status_color=PLAN_STATUS_COLORS.get(status, PLAN_STATUS_DEFAULT_COLOR), status=status.upper(),
+    ))
+    
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        if st.button(f"🎯 COMMENCE", key=f"start_{i}"):
+            st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "in_progress")
+            st.session_state.planner_study_mode = True
+            st.session_state.planner_study_topic = item_topic
+            # Full rerun: the training zone lives outside this fragment (and another item's may close)
+            st.rerun()
+    with c2:
+        if st.button(f"✅ MISSION COMPLETE", key=f"comp_{i}"):
+            st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "completed")
+            st.rerun(scope="fragment")
+    with c3:
+        if st.button(f"💤 REGROUP", key=f"pend_{i}"):
+            st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "pending")
+            st.rerun(scope="fragment")
 
 def show_planner_page():
     """Revision Planner page with Designer Comic Style"""
@@ -1160,7 +1213,6 @@ def show_planner_page():
                     )
                 if plan and len(plan) > 0:
                     st.success(f"✅ Strategic Battle Plan ready with {len(plan)} targets identified!")
-                    st.rerun()
                 else:
                     st.warning("⚠️ No topics found to create a plan. Please process documents first!")
             except Exception as e:
@@ -1175,73 +1227,22 @@ def show_planner_page():
             st.markdown(f'<h3 class="designer-header" style="font-size: 2.5rem;">⚔️ {len(plan)} TARGET MISSIONS IDENTIFIED</h3>', unsafe_allow_html=True)
             
             for i, item in enumerate(plan):
-                item_date = item.get('date', 'TBD')
                 item_topic = item.get('topic', 'General Study')
-                status = item.get('status', 'pending')
-                
-                status_color = "#ffc107" if status == "pending" else "#28a745" if status == "completed" else "#17a2b8"
-                
-                st.markdown(f"""
-                <div class="designer-card-red" style="transform: rotate({(i%2)*0.5 - 0.25}deg); border-width: 8px !important; padding: 2rem !important; margin-bottom: 1rem !important;">
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <div>
-                            <span style="background: #000; color: #fff; padding: 5px 15px; font-family: 'Bangers'; font-size: 1.2rem; border: 2px solid #fff;">{item_date}</span>
-                            <h3 style="margin: 15px 0 5px 0; font-family: 'Bangers'; font-size: 2.2rem; color: #fff; text-shadow: 3px 3px 0px #000;">{item_topic.upper()}</h3>
-                        </div>
-                        <div style="text-align: right;">
-                            <span style="background: {status_color}; color: #fff; padding: 8px 20px; font-family: 'Bangers'; border: 4px solid #000; font-size: 1.2rem;">{status.upper()}</span>
-                        </div>
-                    </div>
-                    <div style="margin-top: 1.5rem; display: flex; gap: 10px;">
-                """, unsafe_allow_html=True)
-                
-                c1, c2, c3 = st.columns(3)
-                with c1:
-                    if st.button(f"🎯 COMMENCE", key=f"start_{i}"):
-                        st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "in_progress")
-                        st.session_state.planner_study_mode = True
-                        st.session_state.planner_study_topic = item_topic
-                        st.rerun()
-                with c2:
-                    if st.button(f"✅ MISSION COMPLETE", key=f"comp_{i}"):
-                        st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "completed")
-                        st.rerun()
-                with c3:
-                    if st.button(f"💤 REGROUP", key=f"pend_{i}"):
-                        st.session_state.agent_controller.planner_agent.mark_status(item_date, item_topic, "pending")
-                        st.rerun()
-                
-                st.markdown('</div></div>', unsafe_allow_html=True)
+                topic_upper = item_topic.upper()
+                _render_plan_item(i, item)
 
                 # Study Zone for Topic
                 if st.session_state.get('planner_study_mode') and st.session_state.get('planner_study_topic') == item_topic:
-                    st.markdown(f"""
-                    <div style="background: #000; padding: 2.5rem; border: 10px dashed var(--deadpool-red); margin: 2rem 0; position: relative;">
-                        <div style="position: absolute; top: -20px; left: 50%; transform: translateX(-50%); background: var(--deadpool-red); color: white; padding: 5px 30px; font-family: 'Bangers'; font-size: 1.5rem; border: 4px solid #fff;">ACTIVE TRAINING ZONE</div>
-                        <h2 class='designer-header' style="font-size: 2.5rem;">TOPIC: {item_topic.upper()}</h2>
-                    """, unsafe_allow_html=True)
-                    
                     with st.container():
-                        st.markdown('<div style="background: #1a1a1a; padding: 1.5rem; border-left: 10px solid var(--deadpool-red);">', unsafe_allow_html=True)
-                        st.markdown(f"**OBJECTIVE:** Master {item_topic} using all available assets.")
-                        st.markdown("---")
+                        st.html(TRAINING_ZONE_TEMPLATE.format(topic_upper=html.escape(topic_upper), topic=html.escape(item_topic)))
                         
                         col_a, col_b = st.columns(2)
                         with col_a:
-                            if st.button("📇 LOAD TOPIC CARDS", key=f"load_cards_{i}"):
-                                st.session_state.current_page = "Flashcards"
-                                st.rerun()
+                            st.button("📇 LOAD TOPIC CARDS", key=f"load_cards_{i}", on_click=_navigate, args=("Flashcards",))
                         with col_b:
-                            if st.button("💬 INTERROGATE AI", key=f"load_chat_{i}"):
-                                st.session_state.current_page = "Chat Assistant"
-                                st.rerun()
+                            st.button("💬 INTERROGATE AI", key=f"load_chat_{i}", on_click=_navigate, args=("Chat Assistant",))
                         
-                        if st.button("❌ CLOSE TRAINING ZONE", key=f"close_study_{item_date}_{item_topic}"):
-                            st.session_state.planner_study_mode = None
-                            st.session_state.planner_study_topic = None
-                            st.rerun()
-                        st.markdown('</div>', unsafe_allow_html=True)
-                    st.markdown('</div>', unsafe_allow_html=True)
+                        st.button("❌ CLOSE TRAINING ZONE", key=f"close_study_{i}", on_click=_close_study_zone)
     except Exception as e:
         logger.exception(f"Error loading/displaying plan: {e}")
         st.info("Initiate a Strategic Battle Plan to track your mission progress!")
@@ -1270,83 +1271,91 @@ def show_chat_page():
         if st.session_state.latest_document:
             st.markdown(f'<div style="background: rgba(168,0,0,0.1); padding: 0.5rem 1rem; border-left: 5px solid var(--deadpool-red); color: #fff;">📄 <strong>PRIORITY ARSENAL SOURCE:</strong> {st.session_state.latest_document}</div>', unsafe_allow_html=True)
     with col2:
-        if st.button("🗑️ WIPE CHAT HISTORY", use_container_width=True):
-            st.session_state.chat_history = []
-            st.rerun()
+        st.button("🗑️ WIPE CHAT HISTORY", use_container_width=True, on_click=_wipe_chat)
     
-    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(SPACER_HTML, unsafe_allow_html=True)
     
-    # History with Custom Bubbles
-    for chat in st.session_state.chat_history:
-        if isinstance(chat, tuple):
-            q, a = chat
-            s = []
+    # Older exchanges stay out of the render path until asked for
+    archive = st.session_state.chat_archive
+    if archive:
+        if st.session_state.show_chat_archive:
+            st.markdown("".join(chat['html'] for chat in archive), unsafe_allow_html=True)
         else:
-            q = chat.get('question', '')
-            a = chat.get('answer', '')
-            s = chat.get('sources', [])
-        
-        st.markdown(f'<div class="chat-bubble user-bubble"><strong>YOU:</strong><br>{q}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="chat-bubble assistant-bubble"><strong>DEADPOOL:</strong><br>{a}</div>', unsafe_allow_html=True)
-        
-        if s:
-            with st.expander("📚 MISSION SOURCE CITATIONS"):
-                for src in s: st.markdown(f"• <span style='color:#aaa;'>{src}</span>", unsafe_allow_html=True)
+            st.button(f"📜 LOAD OLDER MISSION LOGS ({len(archive)})", use_container_width=True, on_click=_show_chat_archive)
     
-    st.markdown("<br>", unsafe_allow_html=True)
+    # History with Custom Bubbles - each exchange pre-rendered once, one markdown element for the recent window
+    if st.session_state.chat_history:
+        st.markdown("".join(chat['html'] for chat in st.session_state.chat_history), unsafe_allow_html=True)
     
-    # Input area
-    with st.container():
-        st.markdown('<div class="designer-card-red" style="border-width: 6px; padding: 2rem !important;">', unsafe_allow_html=True)
-        q_input = st.text_input("💭 INTERROGATE THE SYSTEM (ASK ANYTHING):", placeholder="e.g., Explain the primary directives of the mission...")
-        if st.button("🔍 INITIATE INTERROGATION", type="primary", use_container_width=True):
-            if q_input:
-                if not st.session_state.agent_controller:
-                    st.error("⚠️ Agent controller not initialized. Please process documents first!")
-                    logger.error("Chat: agent_controller is None")
-                elif not st.session_state.vector_store:
-                    st.error("⚠️ Vector store not initialized. Please process documents first!")
-                    logger.error("Chat: vector_store is None")
-                else:
-                    # Check vector store count
-                    vs_count = st.session_state.vector_store.get_collection_count()
-                    logger.info(f"Chat: vector_store has {vs_count} chunks indexed")
-                    
-                    if vs_count == 0:
-                        # Try auto-reindex one more time
-                        memory_chunks = st.session_state.agent_controller.memory.chunks
-                        if memory_chunks and len(memory_chunks) > 0:
-                            with st.spinner("🔄 Indexing documents..."):
-                                st.session_state.vector_store.add_documents(memory_chunks)
-                                st.session_state.agent_controller.chat_agent.vector_store = st.session_state.vector_store
-                            logger.info(f"Chat: Auto-reindexed {len(memory_chunks)} chunks")
-                        else:
-                            st.error("⚠️ No documents processed. Upload and process documents first!")
-                            logger.warning("Chat: No chunks in memory and vector store empty")
-                            return
-                    
-                    try:
-                        with st.spinner("Searching through the sematic archives... stay frosty..."):
-                            logger.info(f"Chat: Answering question: {q_input[:50]}...")
-                            res = st.session_state.agent_controller.answer_question(
-                                q_input, 
-                                prioritize_source=st.session_state.get('latest_document')
-                            )
-                            if res and 'answer' in res:
-                                logger.info(f"Chat: Got answer with {len(res.get('sources', []))} sources")
-                                st.session_state.chat_history.append({
-                                    'question': q_input, 
-                                    'answer': res['answer'], 
-                                    'sources': res.get('sources', [])
-                                })
-                                st.rerun()
-                            else:
-                                st.error("⚠️ Failed to get answer from agent. Please try again.")
-                                logger.warning(f"Chat: answer_question returned invalid response: {res}")
-                    except Exception as e:
-                        st.error(f"⚠️ Error: {str(e)}")
-                        logger.exception("Error in chat page")
-        st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown(SPACER_HTML, unsafe_allow_html=True)
+    
+    # Input area (fragment: typing and clicking here doesn't rerun the page)
+    _render_chat_input()
+
+def _chat_exchange_html(question: str, answer: str, sources: List[str]) -> str:
+    """Bubbles (and collapsed source citations) for one Q/A exchange.
+    
+    The history is drawn as one joined element, so user/LLM text is escaped here."""
+    bubbles = (f'<div class="chat-bubble user-bubble"><strong>YOU:</strong><br>{html.escape(question)}</div>'
+            f'<div class="chat-bubble assistant-bubble"><strong>DEADPOOL:</strong><br>{html.escape(answer)}</div>')
+    if sources:
+        bubbles += CHAT_SOURCES_BLOCK_TEMPLATE.format("<br>".join(CHAT_SOURCE_TEMPLATE.format(html.escape(src)) for src in sources))
+    return bubbles
+
+@st.fragment
+def _render_chat_input():
+    """Question box + submit, scoped so widget interaction reruns only this block."""
+    st.markdown('<div class="designer-card-red" style="border-width: 6px; padding: 2rem !important;">', unsafe_allow_html=True)
+    q_input = st.text_input("💭 INTERROGATE THE SYSTEM (ASK ANYTHING):", placeholder="e.g., Explain the primary directives of the mission...")
+    if st.button("🔍 INITIATE INTERROGATION", type="primary", use_container_width=True):
+        if q_input:
+            if not st.session_state.agent_controller:
+                st.error("⚠️ Agent controller not initialized. Please process documents first!")
+                logger.error("Chat: agent_controller is None")
+            elif not st.session_state.vector_store:
+                st.error("⚠️ Vector store not initialized. Please process documents first!")
+                logger.error("Chat: vector_store is None")
+            else:
+                # Check vector store count
+                vs_count = st.session_state.vector_store.get_collection_count()
+                logger.info(f"Chat: vector_store has {vs_count} chunks indexed")
+                
+                if vs_count == 0:
+                    # Try auto-reindex one more time
+                    memory_chunks = st.session_state.agent_controller.memory.chunks
+                    if memory_chunks and len(memory_chunks) > 0:
+                        with st.spinner("🔄 Indexing documents..."):
+                            st.session_state.vector_store.add_documents(memory_chunks)
+                            st.session_state.agent_controller.chat_agent.vector_store = st.session_state.vector_store
+                        logger.info(f"Chat: Auto-reindexed {len(memory_chunks)} chunks")
+                    else:
+                        st.error("⚠️ No documents processed. Upload and process documents first!")
+                        logger.warning("Chat: No chunks in memory and vector store empty")
+                        return
+                
+                try:
+                    with st.spinner("Searching through the sematic archives... stay frosty..."):
+                        logger.info(f"Chat: Answering question: {q_input[:50]}...")
+                        res = st.session_state.agent_controller.answer_question_stream(
+                            q_input, 
+                            prioritize_source=st.session_state.get('latest_document')
+                        )
+                    if res and 'answer' in res:
+                        # Tokens show up as the model produces them; the finished exchange joins the history on rerun
+                        st.markdown('<strong>DEADPOOL:</strong>', unsafe_allow_html=True)
+                        answer = st.write_stream(res['answer'])
+                        if not isinstance(answer, str):
+                            answer = "".join(map(str, answer))
+                        logger.info(f"Chat: Got answer with {len(res.get('sources', []))} sources")
+                        _append_chat(q_input, answer, res.get('sources', []))
+                        st.rerun()
+                    else:
+                        st.error("⚠️ Failed to get answer from agent. Please try again.")
+                        logger.warning(f"Chat: answer_question_stream returned invalid response: {res}")
+                except Exception as e:
+                    st.error(f"⚠️ Error: {str(e)}")
+                    logger.exception("Error in chat page")
+    st.markdown('</div>', unsafe_allow_html=True)
 
 def show_analytics_page():
     """Analytics and progress tracking with Designer Comic Style"""
@@ -1363,14 +1372,19 @@ def show_analytics_page():
     
     stats = st.session_state.agent_controller.get_statistics()
     
-    st.markdown('<div class="designer-card" style="border-width: 6px;">', unsafe_allow_html=True)
-    st.markdown('<h2 class="designer-header">📈 STUDY PROGRESS METRICS</h2>', unsafe_allow_html=True)
-    c1, c2, c3, c4 = st.columns(4)
-    with c1: st.markdown(f'<div style="text-align:center;"><h4 class="designer-header" style="font-size:1rem;">TOPICS</h4><p style="font-size:2.5rem; font-family:Bangers; color:#fff; margin:0;">{stats["total_topics"]}</p></div>', unsafe_allow_html=True)
-    with c2: st.markdown(f'<div style="text-align:center;"><h4 class="designer-header" style="font-size:1rem;">CHUNKS</h4><p style="font-size:2.5rem; font-family:Bangers; color:#fff; margin:0;">{stats["total_chunks"]}</p></div>', unsafe_allow_html=True)
-    with c3: st.markdown(f'<div style="text-align:center;"><h4 class="designer-header" style="font-size:1rem;">FLASHCARDS</h4><p style="font-size:2.5rem; font-family:Bangers; color:#fff; margin:0;">{stats["total_flashcards"]}</p></div>', unsafe_allow_html=True)
-    with c4: st.markdown(f'<div style="text-align:center;"><h4 class="designer-header" style="font-size:1rem;">QUIZZES</h4><p style="font-size:2.5rem; font-family:Bangers; color:#fff; margin:0;">{stats["total_quizzes"]}</p></div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+    # One element for the whole KPI row instead of four columns of markdown
+    tiles = "".join(ANALYTICS_TILE_TEMPLATE.format(label=label, value=stats[key]) for label, key in (
+        ("TOPICS", "total_topics"),
+        ("CHUNKS", "total_chunks"),
+        ("FLASHCARDS", "total_flashcards"),
+        ("QUIZZES", "total_quizzes"),
+    ))
+    st.html(
+        '<div class="designer-card" style="border-width: 6px;">'
+        '<h2 class="designer-header">📈 STUDY PROGRESS METRICS</h2>'
+        f'<div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;">{tiles}</div>'
+        '</div>'
+    )
     
     col1, col2 = st.columns(2)
     with col1:
@@ -1406,5 +1420,15 @@ def show_analytics_page():
             """, unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
 
+# Page dispatch: only the active page's function runs; agent/vector-store imports stay deferred
+PAGE_RENDERERS = {
+    "Home": show_home_page,
+    "Flashcards": show_flashcards_page,
+    "Quizzes": show_quizzes_page,
+    "Revision Planner": show_planner_page,
+    "Chat Assistant": show_chat_page,
+    "Analytics": show_analytics_page,
+}
+
 if __name__ == "__main__":
     main()
@@ -3,7 +3,9 @@ RAG Pipeline
 Implements Retrieval-Augmented Generation for question answering
 """
 
+import functools
 import os
+import re
 from pathlib import Path
 from typing import List, Dict, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -21,6 +23,55 @@ except UnicodeDecodeError:
 except Exception:
     pass
 
+# Matches an uncommented GOOGLE_API_KEY=... line, with optional quotes around the value
+_ENV_RE = re.compile(r'^\s*GOOGLE_API_KEY\s*=\s*["\']?([^"\'\r\n]+?)["\']?\s*$', re.MULTILINE)
+
+
+@functools.cache
+def load_api_key() -> Optional[str]:
+    """Resolve GOOGLE_API_KEY once per process (env, then .env files, then a raw file scan)"""
+    # Try multiple methods to load API key
+    api_key = None
+    
+    # Method 1: Try environment variable (already set, works for Streamlit Cloud)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    
+    # Method 2: Try from current directory .env file
+    if not api_key:
+        env_path_current = Path('.env')
+        if env_path_current.exists():
+            load_dotenv(dotenv_path=env_path_current, override=True)
+            api_key = os.getenv("GOOGLE_API_KEY")
+    
+    # Method 3: Try from script's parent directory .env file
+    if not api_key:
+        env_path_script = Path(__file__).parent / '.env'
+        if env_path_script.exists():
+            load_dotenv(dotenv_path=env_path_script, override=True)
+            api_key = os.getenv("GOOGLE_API_KEY")
+    
+    # Method 4: Read directly from file (most reliable fallback)
+    if not api_key:
+        for env_path in [env_path_current, Path(__file__).parent / '.env']:
+            try:
+                if env_path.exists():
+                    # Try different encodings
+                    for encoding in ['utf-8', 'utf-8-sig', 'latin-1']:
+                        try:
+                            with open(env_path, 'r', encoding=encoding) as f:
+                                match = _ENV_RE.search(f.read())
+                            if match:
+                                api_key = match.group(1)
+                                break
+                        except Exception:
+                            continue
+                    if api_key:
+                        break
+            except Exception as e:
+                continue
+    
+    return api_key
+
 
 class RAGPipeline:
     """Retrieval-Augmented Generation pipeline for answering questions"""
@@ -36,53 +87,11 @@ class RAGPipeline:
         """
         self.vector_store = vector_store
         
-        # Try multiple methods to load API key
-        api_key = None
-        
-        # Method 1: Try environment variable (already set, works for Streamlit Cloud)
-        api_key = os.getenv("GOOGLE_API_KEY")
-        
-        # Method 2: Try from current directory .env file
-        if not api_key:
-            env_path_current = Path('.env')
-            if env_path_current.exists():
-                load_dotenv(dotenv_path=env_path_current, override=True)
-                api_key = os.getenv("GOOGLE_API_KEY")
-        
-        # Method 3: Try from script's parent directory .env file
-        if not api_key:
-            env_path_script = Path(__file__).parent / '.env'
-            if env_path_script.exists():
-                load_dotenv(dotenv_path=env_path_script, override=True)
-                api_key = os.getenv("GOOGLE_API_KEY")
-        
-        # Method 4: Read directly from file (most reliable fallback)
-        if not api_key:
-            for env_path in [env_path_current, Path(__file__).parent / '.env']:
-                try:
-                    if env_path.exists():
-                        # Try different encodings
-                        for encoding in ['utf-8', 'utf-8-sig', 'latin-1']:
-                            try:
-                                with open(env_path, 'r', encoding=encoding) as f:
-                                    for line in f:
-                                        line_clean = line.strip()
-                                        if line_clean and not line_clean.startswith('#') and 'GOOGLE_API_KEY' in line_clean:
-                                            if '=' in line_clean:
-                                                api_key = line_clean.split('=', 1)[1].strip()
-                                                # Remove quotes if present
-                                                api_key = api_key.strip('"').strip("'")
-                                                break
-                                    if api_key:
-                                        break
-                            except Exception:
-                                continue
-                        if api_key:
-                            break
-                except Exception as e:
-                    continue
+        api_key = load_api_key()
         
         if not api_key:
+            # Don't pin the miss: a key added to .env later should be picked up
+            load_api_key.cache_clear()
             raise ValueError(
                 "GOOGLE_API_KEY not found in environment variables. "
                 "Please set it in .env file in the project root directory. "
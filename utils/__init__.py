@@ -1,10 +1,15 @@
 """Utility modules for the application"""
 
+import functools
 import os
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Mapping, Optional
 
+# Env/secrets keys that can hold the LLM API key, in lookup priority order
+API_KEY_NAMES = ("GOOGLE_API_KEY", "OPENAI_API_KEY")
 
+
+@functools.cache
 def ensure_documents_directory() -> Path:
     """Ensure documents directory exists"""
     docs_dir = Path("documents")
@@ -33,6 +38,21 @@ def get_document_files() -> List[str]:
     return files
 
 
+@functools.lru_cache(maxsize=None)
+def load_env() -> None:
+    """Load .env into os.environ once per process; a missing or badly encoded file is ignored"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+
+def first_set(source: Mapping, keys=API_KEY_NAMES) -> Optional[str]:
+    """Return the first non-empty value for keys in a mapping (os.environ, st.secrets, ...)"""
+    return next((source[k] for k in keys if source.get(k)), None)
+
+
 def format_sources(sources: List[str]) -> str:
     """Format source list for display"""
     if not sources:
@@ -51,15 +71,13 @@ def get_latest_document() -> Optional[str]:
         return None
     
     # Get file modification times and return the most recent
+    # Integer mtime_ns: full resolution, and stat() failing already covers a vanished file
     files_with_time = []
     for doc_path_str in doc_files:
-        doc_path = Path(doc_path_str)
-        if doc_path.exists():
-            try:
-                mtime = doc_path.stat().st_mtime
-                files_with_time.append((mtime, doc_path_str))
-            except Exception:
-                continue
+        try:
+            files_with_time.append((os.stat(doc_path_str).st_mtime_ns, doc_path_str))
+        except OSError:
+            continue
     
     if not files_with_time:
         return None
@@ -90,7 +108,10 @@ def detect_multi_document_intent(question: str) -> bool:
 
 
 __all__ = [
+    'API_KEY_NAMES',
     'ensure_documents_directory',
+    'first_set',
+    'load_env',
     'get_document_files',
     'format_sources',
     'get_latest_document',
@@ -5,11 +5,16 @@ Provides fallback embedding generation using OpenAI or Google Gemini APIs
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Texts per API request, and how many requests may be in flight at once (embedding calls are network-bound)
+API_BATCH_SIZE = int(os.getenv("EMBED_API_BATCH_SIZE", "100"))
+MAX_CONCURRENT_BATCHES = int(os.getenv("EMBED_MAX_CONCURRENT_BATCHES", "4"))
+
 
 class APiEmbeddingsWrapper:
     """
@@ -81,11 +86,18 @@ class APiEmbeddingsWrapper:
         
         try:
             if self.provider == "openai":
-                return self._embed_openai(texts)
+                embed_batch = self._embed_openai
             elif self.provider == "gemini":
-                return self._embed_gemini(texts)
+                embed_batch = self._embed_gemini
             else:
                 raise ValueError(f"Unsupported provider: {self.provider}")
+            
+            batches = [texts[i:i + API_BATCH_SIZE] for i in range(0, len(texts), API_BATCH_SIZE)]
+            if len(batches) == 1:
+                return embed_batch(texts)
+            # Overlap request latency across batches; map() keeps results in input order
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_BATCHES, len(batches))) as ex:
+                return [vec for batch in ex.map(embed_batch, batches) for vec in batch]
         except Exception as e:
             logger.exception(f"Error generating embeddings via API: {e}")
             raise RuntimeError(f"Failed to generate embeddings via {self.provider} API: {e}") from e
@@ -33,10 +33,24 @@ if hasattr(torch, 'cuda'):
 import chromadb
 from chromadb.config import Settings
 from typing import List, Dict, Optional, Union
-from pathlib import Path
 import hashlib
 import numpy as np
 
+# HNSW index settings for the Chroma collection (only applied when the collection is created).
+# Chroma has no fp16/PQ storage; graph degree and search breadth are the memory/latency knobs it exposes.
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+for _key, _env in (("hnsw:M", "CHROMA_HNSW_M"), ("hnsw:search_ef", "CHROMA_HNSW_SEARCH_EF")):
+    if os.getenv(_env):
+        COLLECTION_METADATA[_key] = int(os.environ[_env])
+
+# Chunks per forward pass for the local model; large enough to amortise per-batch torch overhead
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Chunks per collection.add; keeps each write well under Chroma's max batch size
+ADD_BATCH_SIZE = int(os.getenv("CHROMA_ADD_BATCH_SIZE", "256"))
+# Optional Chroma server (`chroma run --path ./vector_db --port 8000`); keeps the index out of the app process
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
 
 class VectorStore:
     """
@@ -65,6 +79,8 @@ class VectorStore:
         """
         self.persist_directory = persist_directory
         self.model_name = model_name
+        # Bumped on every write so callers can cache reads like the chunk count
+        self.version = 0
         
         # Allow override by env/config
         self.embedding_backend = embedding_backend or os.getenv("EMBEDDING_BACKEND", "auto").lower()
@@ -201,16 +217,24 @@ class VectorStore:
     
     def _init_chromadb(self):
         """Initialize ChromaDB client and collection"""
-        os.makedirs(self.persist_directory, exist_ok=True)
-        self.client = chromadb.PersistentClient(
-            path=self.persist_directory,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        if CHROMA_HOST:
+            self.client = chromadb.HttpClient(
+                host=CHROMA_HOST,
+                port=CHROMA_PORT,
+                settings=Settings(anonymized_telemetry=False)
+            )
+            logger.info("Using Chroma server at %s:%s", CHROMA_HOST, CHROMA_PORT)
+        else:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            self.client = chromadb.PersistentClient(
+                path=self.persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
         
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name="campus_compass",
-            metadata={"hnsw:space": "cosine"}
+            metadata=COLLECTION_METADATA
         )
     
     def embed_text(self, texts: Union[str, List[str]]) -> List[List[float]]:
@@ -229,7 +253,9 @@ class VectorStore:
             if isinstance(texts, str):
                 texts = [texts]
             # sentence_transformers returns numpy arrays
-            embeddings = self.embedding_model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+            embeddings = self.embedding_model.encode(
+                texts, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True
+            )
             # Convert to list of lists
             if isinstance(embeddings, np.ndarray):
                 return embeddings.tolist()
@@ -271,14 +297,17 @@ class VectorStore:
         logger.info(f"Generating embeddings for {len(texts)} chunks using backend: {self.embedding_backend}")
         embeddings = self.embed_text(texts)
         
-        # Add to ChromaDB
-        self.collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Add to ChromaDB in bounded batches (one huge add can exceed the client's max batch size)
+        for start in range(0, len(texts), ADD_BATCH_SIZE):
+            end = start + ADD_BATCH_SIZE
+            self.collection.add(
+                embeddings=embeddings[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end]
+            )
         
+        self.version += 1
         logger.info(f"Added {len(texts)} chunks to vector store")
     
     def search(self, query: str, n_results: int = 5, prioritize_source: Optional[str] = None) -> List[Dict]:
@@ -319,7 +348,7 @@ class VectorStore:
         if prioritize_source and formatted_results:
             prioritized = []
             others = []
-            source_name = Path(prioritize_source).name if prioritize_source else None
+            source_name = os.path.basename(prioritize_source) if prioritize_source else None
             
             for chunk in formatted_results:
                 chunk_source = chunk['metadata'].get('source', '')
@@ -333,14 +362,23 @@ class VectorStore:
         
         return formatted_results
     
+    def delete_source(self, source: str):
+        """Remove every chunk that came from one source file"""
+        try:
+            self.collection.delete(where={"source": source})
+            self.version += 1
+        except Exception as e:
+            logger.warning(f"Error deleting chunks for {source}: {e}")
+    
     def clear_collection(self):
         """Clear all documents from the collection"""
         try:
             self.client.delete_collection(name="campus_compass")
             self.collection = self.client.get_or_create_collection(
                 name="campus_compass",
-                metadata={"hnsw:space": "cosine"}
+                metadata=COLLECTION_METADATA
             )
+            self.version += 1
             logger.info("Vector store cleared")
         except Exception as e:
             logger.error(f"Error clearing collection: {e}")
@@ -359,7 +397,7 @@ class VectorStore:
             try:
                 self.collection = self.client.get_or_create_collection(
                     name="campus_compass",
-                    metadata={"hnsw:space": "cosine"}
+                    metadata=COLLECTION_METADATA
                 )
                 return self.collection.count()
             except: